@@ -0,0 +1,90 @@
+from hashlib import md5
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.response import Response
+
+from recipes.replicas import may_be_stale
+from recipes.versions import (RECIPE_DATA_VERSION_KEY, get_modified,
+                              get_version)
+from .pagination import FoodgramPagination
+
+HITS_KEY = 'api:response_cache:hits'
+MISSES_KEY = 'api:response_cache:misses'
+
+
+def _increment(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def get_cache_stats():
+    """Число попаданий и промахов кэша ответов с момента сброса"""
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': hits / total if total else 0.0,
+    }
+
+
+def reset_cache_stats():
+    cache.delete_many((HITS_KEY, MISSES_KEY))
+
+
+class AnonymousResponseCacheMixin:
+    """Кэширует list и retrieve для анонимных пользователей.
+
+    В ключ входит версия данных рецептов, поэтому после изменения
+    рецептов, тегов или ингредиентов старые записи больше не читаются
+    и истекают по таймауту.
+    """
+    response_cache_timeout = settings.RESPONSE_CACHE_TIMEOUT
+
+    def get_response_cache_key(self, request):
+        params = sorted(
+            (key, value)
+            for key, values in request.query_params.lists()
+            for value in values
+            if value != ''
+        )
+        query = md5(urlencode(params).encode()).hexdigest()
+        lookup = self.kwargs.get(self.lookup_url_kwarg or self.lookup_field)
+        # Пустой cursor включает постраничный вывод по курсору, поэтому
+        # режим пагинации входит в ключ отдельно от параметров
+        mode = ('cursor' if FoodgramPagination.is_cursor_request(request)
+                else 'page')
+        version = get_version(RECIPE_DATA_VERSION_KEY)
+        return (f'api:response:{version}:{self.basename}:'
+                f'{self.action}:{lookup}:{mode}:{query}')
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if not request.user.is_anonymous:
+            return handler(request, *args, **kwargs)
+        key = self.get_response_cache_key(request)
+        data = cache.get(key)
+        if data is not None:
+            _increment(HITS_KEY)
+            return Response(data, headers={'X-Cache': 'HIT'})
+        _increment(MISSES_KEY)
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200 and not may_be_stale(
+            get_modified(RECIPE_DATA_VERSION_KEY)
+        ):
+            cache.set(key, response.data, self.response_cache_timeout)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
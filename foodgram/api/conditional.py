@@ -0,0 +1,78 @@
+from hashlib import sha1
+from urllib.parse import urlencode
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from recipes.replicas import may_be_stale
+from recipes.versions import (get_modified, get_version,
+                              user_state_version_key)
+
+
+def user_state(user):
+    """Версия и время изменения избранного, корзины и подписок"""
+    if user.is_anonymous:
+        return None, None
+    key = user_state_version_key(user.pk)
+    return (user.pk, get_version(key)), get_modified(key)
+
+
+def normalized_query(request):
+    """Параметры запроса в постоянном порядке"""
+    return urlencode(sorted(
+        (key, value)
+        for key, values in request.query_params.lists()
+        for value in values
+    ))
+
+
+class ConditionalGetMixin:
+    """Условные GET-запросы для list и retrieve.
+
+    Вьюсет определяет get_conditional_state(request, *args, **kwargs),
+    который возвращает пару (части ETag, время изменения или None),
+    вычисляемую без сериализации, или None, если ответ не кэшируется.
+    Если клиент прислал совпадающий If-None-Match (или
+    If-Modified-Since), сразу отдается 304.
+    """
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        state = self.get_conditional_state(request, *args, **kwargs)
+        if state is None:
+            return handler(request, *args, **kwargs)
+        parts, last_modified = state
+        source = '|'.join(str(part) for part in (self.basename, *parts))
+        etag = quote_etag(sha1(source.encode()).hexdigest())
+        not_modified = get_conditional_response(
+            request._request, etag=etag, last_modified=last_modified
+        )
+        if not_modified is not None:
+            return not_modified
+        response = handler(request, *args, **kwargs)
+        # Ответ с отстающей реплики не должен получить новый ETag
+        if response.status_code == 200 and not may_be_stale(last_modified):
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+
+class VersionedConditionalGetMixin(ConditionalGetMixin):
+    """Условные запросы для справочников с номером версии в кэше"""
+    version_key = None
+
+    def get_conditional_state(self, request, *args, **kwargs):
+        return (
+            (get_version(self.version_key), request.get_full_path()),
+            get_modified(self.version_key),
+        )
@@ -1,6 +1,7 @@
 from django_filters import rest_framework as filters
 
-from recipes.models import Recipe, Tag
+from recipes.models import Recipe
+from recipes.registry import tag_registry
 from users.models import User
 
 
@@ -9,11 +10,10 @@ class RecipeFilter(filters.FilterSet):
         label='Автор',
         queryset=User.objects.all()
     )
-    tags = filters.ModelMultipleChoiceFilter(
+    tags = filters.MultipleChoiceFilter(
         label='Теги',
-        queryset=Tag.objects.all(),
         field_name='tags__slug',
-        to_field_name='slug',
+        choices=lambda: [(slug, slug) for slug in tag_registry.slugs()],
     )
     is_favorited = filters.BooleanFilter(
         method='filter_favorited'
@@ -21,6 +21,10 @@ class RecipeFilter(filters.FilterSet):
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_in_shopping_cart'
     )
+    search = filters.CharFilter(
+        label='Поиск',
+        method='filter_search'
+    )
 
     class Meta:
         model = Recipe
@@ -28,7 +32,8 @@ class RecipeFilter(filters.FilterSet):
             'is_favorited',
             'author',
             'is_in_shopping_cart',
-            'tags')
+            'tags',
+            'search')
 
     def filter_favorited(self, queryset, name, value):
         if value and self.request.user.is_authenticated:
@@ -39,3 +44,8 @@ class RecipeFilter(filters.FilterSet):
         if value and self.request.user.is_authenticated:
             return queryset.filter(shopping_cart__user=self.request.user)
         return queryset
+
+    def filter_search(self, queryset, name, value):
+        if value:
+            return queryset.search(value)
+        return queryset
@@ -1,6 +1,45 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 
 
-class FoodgramPagination(PageNumberPagination):
+class FoodgramCursorPagination(CursorPagination):
+    """Пагинация по ключу для бесконечной ленты: без COUNT(*) и OFFSET"""
     page_size_query_param = 'limit'
     page_size = 6
+    ordering = '-pk'
+
+
+class FoodgramPageNumberPagination(PageNumberPagination):
+    """Постраничная пагинация без перехода на курсоры - для списков,
+    которые собираются не запросом к базе данных"""
+    page_size_query_param = 'limit'
+    page_size = 6
+
+
+class FoodgramPagination(FoodgramPageNumberPagination):
+    """Постраничная пагинация.
+
+    Если в запросе есть параметр cursor (для первой страницы - пустой),
+    используется курсорная пагинация FoodgramCursorPagination.
+    """
+    cursor_pagination_class = FoodgramCursorPagination
+
+    def __init__(self):
+        self.cursor_paginator = None
+
+    @classmethod
+    def is_cursor_request(cls, request):
+        return (cls.cursor_pagination_class.cursor_query_param
+                in request.query_params)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.is_cursor_request(request):
+            self.cursor_paginator = self.cursor_pagination_class()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
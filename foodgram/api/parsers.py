@@ -0,0 +1,30 @@
+import json
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import DataAndFiles, MultiPartParser
+
+
+class MultiPartJSONParser(MultiPartParser):
+    """multipart/form-data, в котором вложенные поля переданы как JSON.
+
+    Файлы обрабатываются стандартными обработчиками загрузки Django:
+    крупные сразу пишутся во временный файл, а не держатся в памяти.
+    Поля из multipart_json_fields вьюсета декодируются из JSON.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        result = super().parse(stream, media_type, parser_context)
+        json_fields = getattr(
+            parser_context['view'], 'multipart_json_fields', ()
+        )
+        data = {}
+        for key, value in result.data.items():
+            if key in json_fields:
+                try:
+                    value = json.loads(value)
+                except ValueError as exc:
+                    raise ParseError(
+                        f'Поле {key} должно содержать JSON: {exc}'
+                    )
+            data[key] = value
+        return DataAndFiles(data, dict(result.files.items()))
@@ -0,0 +1,136 @@
+import csv
+import json
+from functools import lru_cache
+from io import BytesIO
+
+from django.conf import settings
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen.canvas import Canvas
+from rest_framework.renderers import BaseRenderer
+
+SHOPPING_LIST_TITLE = 'Список покупок: '
+PDF_FONT_NAME = 'ShoppingListFont'
+PDF_FONT_SIZE = 12
+PDF_MARGIN = 50
+PDF_LINE_HEIGHT = 18
+
+
+class _Echo:
+    """Псевдобуфер для csv.writer, возвращающий записанную строку"""
+
+    def write(self, value):
+        return value
+
+
+@lru_cache(maxsize=None)
+def register_pdf_font():
+    """Загружает шрифт с кириллицей один раз на процесс"""
+    pdfmetrics.registerFont(TTFont(PDF_FONT_NAME, settings.PDF_FONT_PATH))
+    return PDF_FONT_NAME
+
+
+class ShoppingListRenderer(BaseRenderer):
+    """Базовый рендерер списка покупок.
+
+    Наследник определяет stream(items) - генератор строк файла по
+    позициям списка; сам список отдается потоком через
+    encode(stream(...)), а render() вызывается DRF только для ответов с
+    ошибками.
+    """
+    charset = 'utf-8'
+    extension = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+    def encode(self, chunks):
+        for chunk in chunks:
+            yield chunk.encode(self.charset)
+
+
+class TextShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+    extension = 'txt'
+
+    def stream(self, items):
+        yield SHOPPING_LIST_TITLE
+        for num, item in enumerate(items, start=1):
+            yield (f'\n{num}. {item["name"]} = '
+                   f'{item["total"]} {item["measurement"]}')
+
+
+class CSVShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+    extension = 'csv'
+
+    def stream(self, items):
+        writer = csv.writer(_Echo())
+        yield writer.writerow(('name', 'amount', 'measurement_unit'))
+        for item in items:
+            yield writer.writerow(
+                (item['name'], item['total'], item['measurement'])
+            )
+
+
+class JSONShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'application/json'
+    format = 'json'
+    extension = 'json'
+
+    def stream(self, items):
+        separator = '['
+        for item in items:
+            yield separator + json.dumps({
+                'name': item['name'],
+                'amount': item['total'],
+                'measurement_unit': item['measurement'],
+            }, ensure_ascii=False)
+            separator = ','
+        yield ']' if separator == ',' else '[]'
+
+
+class PDFShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
+    extension = 'pdf'
+    charset = None
+
+    def stream(self, items):
+        # Формат PDF требует таблицу ссылок в конце файла, поэтому документ
+        # собирается целиком, но в памяти остается только итоговый файл.
+        buffer = BytesIO()
+        font_name = register_pdf_font()
+        canvas = Canvas(buffer, pagesize=A4)
+        _, height = A4
+        y = height - PDF_MARGIN
+        canvas.setFont(font_name, PDF_FONT_SIZE)
+        canvas.drawString(PDF_MARGIN, y, SHOPPING_LIST_TITLE)
+        for num, item in enumerate(items, start=1):
+            y -= PDF_LINE_HEIGHT
+            if y < PDF_MARGIN:
+                canvas.showPage()
+                canvas.setFont(font_name, PDF_FONT_SIZE)
+                y = height - PDF_MARGIN
+            canvas.drawString(
+                PDF_MARGIN, y,
+                f'{num}. {item["name"]} = '
+                f'{item["total"]} {item["measurement"]}'
+            )
+        canvas.save()
+        buffer.seek(0)
+        yield from iter(lambda: buffer.read(8192), b'')
+
+    def encode(self, chunks):
+        return chunks
+
+
+SHOPPING_LIST_RENDERERS = (
+    TextShoppingListRenderer,
+    CSVShoppingListRenderer,
+    JSONShoppingListRenderer,
+    PDFShoppingListRenderer,
+)
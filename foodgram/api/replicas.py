@@ -0,0 +1,31 @@
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.permissions import SAFE_METHODS
+
+from recipes.replicas import (is_pinned, pin_to_primary, replica_pool,
+                              set_alias)
+
+
+class ReplicaReadMixin:
+    """Безопасные запросы читают с реплики, если пользователь недавно
+    ничего не менял; после успешной записи пользователь закрепляется за
+    основной базой"""
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        user = request.user
+        if request.method in SAFE_METHODS and not (
+            user.is_authenticated and is_pinned(user.pk)
+        ):
+            set_alias(replica_pool.choose())
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            response = super().dispatch(request, *args, **kwargs)
+        finally:
+            set_alias(DEFAULT_DB_ALIAS)
+        user = getattr(self.request, 'user', None)
+        if (self.request.method not in SAFE_METHODS
+                and response.status_code < 400
+                and user is not None and user.is_authenticated):
+            pin_to_primary(user.pk)
+        return response
@@ -1,5 +1,7 @@
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import UploadedFile
 from django.db.transaction import atomic
 from djoser.serializers import UserSerializer
 from drf_extra_fields.fields import Base64ImageField
@@ -9,19 +11,89 @@ from rest_framework.validators import UniqueTogetherValidator
 from recipes.models import (Favorite, ShoppingCart,
                             Ingredient, Recipe,
                             RecipeIngredient, Tag)
+from recipes import shopping_list
+from recipes.images import schedule_image_variants
+from recipes.ingredient_index import ingredient_index
+from recipes.registry import tag_registry
+from recipes.similarity import schedule_refresh_recipe
 from users.models import Follow
 
 User = get_user_model()
 
+SELF_FOLLOW_ERROR = 'Нельзя подписываться на самого себя!'
+
+
+class RegistryPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Проверяет первичный ключ по справочнику в памяти, без запроса к БД"""
+    registry = None
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool) or not isinstance(data, (int, str)):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        instance = self.registry.get(data)
+        if instance is None:
+            self.fail('does_not_exist', pk_value=data)
+        return instance
+
+
+class IngredientPrimaryKeyField(RegistryPrimaryKeyRelatedField):
+    registry = ingredient_index
+
+
+class TagPrimaryKeyField(RegistryPrimaryKeyRelatedField):
+    registry = tag_registry
+
+
+class ImageVariantsField(serializers.ReadOnlyField):
+    """Ссылки на уменьшенные копии фото: {размер: {формат: url}}"""
+
+    def to_representation(self, variants):
+        request = self.context.get('request')
+        result = {}
+        for size_name, formats in variants.items():
+            result[size_name] = {}
+            for format_name, name in formats.items():
+                url = default_storage.url(name)
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                result[size_name][format_name] = url
+        return result
+
+
+class RecipeImageField(Base64ImageField):
+    """Фото рецепта строкой base64 или файлом из multipart/form-data.
+
+    Файл проверяется Pillow там, куда его записал обработчик загрузки
+    (для крупных файлов - временный файл на диске).
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, UploadedFile):
+            self.validate_size(data.size)
+            return serializers.ImageField.to_internal_value(self, data)
+        if isinstance(data, str):
+            self.validate_size(len(data) * 3 // 4)
+        return super().to_internal_value(data)
+
+    def validate_size(self, size):
+        if size > settings.RECIPE_IMAGE_MAX_SIZE:
+            raise serializers.ValidationError(
+                f'Размер фото не должен превышать '
+                f'{settings.RECIPE_IMAGE_MAX_SIZE // 2 ** 20} МБ!'
+            )
+
 
 class RecipePreviewSerializer(serializers.ModelSerializer):
     """Сериалайзер для превью рецепта в избранном и корзине"""
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = Recipe
         fields = (
             'id',
             'name',
             'image',
+            'image_variants',
             'cooking_time'
         )
 
@@ -42,6 +114,8 @@ class MyUserSerializer(UserSerializer):
         )
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context.get('request')
         if request.user.is_anonymous:
             return False
@@ -54,7 +128,7 @@ class SubscriptionsSerializer(UserSerializer):
     """
     is_subscribed = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = User
@@ -70,6 +144,8 @@ class SubscriptionsSerializer(UserSerializer):
         )
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context.get('request')
         if request.user.is_anonymous:
             return False
@@ -77,6 +153,10 @@ class SubscriptionsSerializer(UserSerializer):
 
     def get_recipes(self, obj):
         request = self.context.get('request')
+        if hasattr(obj, 'recipes_preview'):
+            return RecipePreviewSerializer(
+                obj.recipes_preview, many=True, context={'request': request}
+            ).data
         recipes = Recipe.objects.filter(author=obj)
         recipes_limit = request.query_params.get('recipes_limit')
         if recipes_limit is not None:
@@ -84,9 +164,6 @@ class SubscriptionsSerializer(UserSerializer):
         return RecipePreviewSerializer(
             recipes, many=True, context={'request': request}).data
 
-    def get_recipes_count(self, obj):
-        return obj.recipe_author.all().count()
-
 
 class FollowSerializer(serializers.ModelSerializer):
     """Сериалайзер для модели подписки на автора"""
@@ -103,9 +180,7 @@ class FollowSerializer(serializers.ModelSerializer):
 
     def validate(self, data):
         if data['user'] == data['following']:
-            raise serializers.ValidationError(
-                'Нельзя подписываться на самого себя!'
-            )
+            raise serializers.ValidationError(SELF_FOLLOW_ERROR)
         return data
 
     def create(self, validated_data):
@@ -181,6 +256,15 @@ class ShoppingCartSerializer(serializers.ModelSerializer):
             }).data
 
 
+class IdListSerializer(serializers.Serializer):
+    """Список идентификаторов для массовых операций"""
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_RELATIONS_MAX_ITEMS,
+    )
+
+
 class RecipeIngredientSerializer(serializers.ModelSerializer):
     """Сериализатор ингредиентов в рецепте"""
     id = serializers.PrimaryKeyRelatedField(
@@ -200,7 +284,7 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
 
 
 class CreateIngredientRecipeSerializator(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(
+    id = IngredientPrimaryKeyField(
         source='ingredient',
         queryset=Ingredient.objects.all()
     )
@@ -231,6 +315,7 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         source='ingredient_in_recipe',
         many=True
     )
+    image_variants = ImageVariantsField()
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
 
@@ -238,13 +323,15 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         model = Recipe
         fields = (
             'id', 'name', 'author',
-            'image', 'ingredients',
+            'image', 'image_variants', 'ingredients',
             'text', 'tags', 'cooking_time',
             'is_favorited', 'is_in_shopping_cart'
         )
         read_only_fields = ('author', 'tags', 'ingredients')
 
     def get_is_favorited(self, recipe):
+        if hasattr(recipe, 'is_favorited'):
+            return recipe.is_favorited
         user = self.context.get('request').user
         return (
             user.is_authenticated
@@ -252,6 +339,8 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         )
 
     def get_is_in_shopping_cart(self, recipe):
+        if hasattr(recipe, 'is_in_shopping_cart'):
+            return recipe.is_in_shopping_cart
         user = self.context.get('request').user
         return (
             user.is_authenticated
@@ -261,14 +350,14 @@ class RecipeReadSerializer(serializers.ModelSerializer):
 
 class RecipeWriteSerializer(serializers.ModelSerializer):
     """Сериализатор для записи рецепта"""
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = TagPrimaryKeyField(
         queryset=Tag.objects.all(), many=True
     )
     author = MyUserSerializer(
         read_only=True, default=serializers.CurrentUserDefault()
     )
     ingredients = CreateIngredientRecipeSerializator(many=True)
-    image = Base64ImageField()
+    image = RecipeImageField()
     cooking_time = serializers.IntegerField()
 
     class Meta:
@@ -291,6 +380,11 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 'Выберите хотя бы один ингредиент!'
             )
+        ingredient_ids = [item['ingredient'].pk for item in data]
+        if len(set(ingredient_ids)) != len(ingredient_ids):
+            raise serializers.ValidationError(
+                'Ингредиенты в рецепте не должны повторяться!'
+            )
         return data
 
     def validate_tags(self, data):
@@ -327,18 +421,63 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         recipe = Recipe.objects.create(**validated_data)
         recipe.tags.set(tags)
         self.bulk_recipe_ingredients(recipe, ingredients)
+        schedule_refresh_recipe(recipe.pk)
+        schedule_image_variants(recipe)
         return recipe
 
+    def update_recipe_ingredients(self, recipe, ingredients):
+        """Приводит состав рецепта к ingredients, изменяя только строки,
+        которые отличаются. Возвращает старое и новое количество
+        ингредиентов или None, если состав не изменился."""
+        current = {
+            row.ingredient_id: row
+            for row in RecipeIngredient.objects.filter(recipe=recipe)
+        }
+        wanted = {
+            item['ingredient'].pk: item['amount'] for item in ingredients
+        }
+        removed = current.keys() - wanted.keys()
+        changed = [
+            row for pk, row in current.items()
+            if pk in wanted and row.amount != wanted[pk]
+        ]
+        added = [
+            RecipeIngredient(recipe=recipe, ingredient_id=pk, amount=amount)
+            for pk, amount in wanted.items() if pk not in current
+        ]
+        if not (removed or changed or added):
+            return None
+        old_amounts = {pk: row.amount for pk, row in current.items()}
+        if removed:
+            # Без сигналов, как bulk_update и bulk_create: списки покупок
+            # обновляются одним change_recipe на весь состав.
+            rows = RecipeIngredient.objects.filter(
+                recipe=recipe, ingredient_id__in=removed
+            )
+            rows._raw_delete(rows.db)
+        for row in changed:
+            row.amount = wanted[row.ingredient_id]
+        RecipeIngredient.objects.bulk_update(changed, ['amount'])
+        RecipeIngredient.objects.bulk_create(added)
+        return old_amounts, wanted
+
     @atomic
     def update(self, instance, validated_data):
-        ingredients = validated_data.pop('ingredients')
-        tags = validated_data.pop('tags')
+        ingredients = validated_data.pop('ingredients', None)
+        tags = validated_data.pop('tags', None)
         if tags is not None:
+            # set() сам сравнивает теги и меняет только отличающиеся
             instance.tags.set(tags)
         if ingredients is not None:
-            instance.ingredients.clear()
-            self.bulk_recipe_ingredients(instance, ingredients)
-        return super().update(instance, validated_data)
+            amounts = self.update_recipe_ingredients(instance, ingredients)
+            if amounts is not None:
+                shopping_list.change_recipe(instance.pk, *amounts)
+                schedule_refresh_recipe(instance.pk)
+        image_changed = 'image' in validated_data
+        recipe = super().update(instance, validated_data)
+        if image_changed:
+            schedule_image_variants(recipe)
+        return recipe
 
     def to_representation(self, instance):
         """Возвращает представление рецепта как после GET-запроса"""
@@ -0,0 +1,238 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections, router
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase, APITransactionTestCase
+
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, Tag)
+from recipes.replicas import replica_pool
+from users.models import Follow, User
+
+RECIPES_COUNT = 30
+# Реплика объявлена в foodgram.test_settings
+REPLICA = 'replica'
+
+
+def create_recipes(count=RECIPES_COUNT):
+    """Рецепты нескольких авторов с тегами и ингредиентами"""
+    authors = [
+        User.objects.create_user(
+            email=f'author{number}@example.com',
+            username=f'author{number}',
+            first_name='Автор',
+            last_name=str(number),
+            password='Password12345!',
+        )
+        for number in range(3)
+    ]
+    tags = [
+        Tag.objects.create(
+            name=f'Тег {number}', color=f'#00000{number}', slug=f'tag{number}'
+        )
+        for number in range(3)
+    ]
+    ingredients = Ingredient.objects.bulk_create(
+        Ingredient(name=f'Ингредиент {number}', measurement_unit='г')
+        for number in range(10)
+    )
+    ingredients = list(Ingredient.objects.all())
+    recipes = []
+    for number in range(count):
+        recipe = Recipe.objects.create(
+            name=f'Рецепт {number}',
+            author=authors[number % len(authors)],
+            image='recipe_pics/test.png',
+            text='Описание',
+            cooking_time=10,
+        )
+        recipe.tags.set(tags[:number % len(tags) + 1])
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=recipe,
+                ingredient=ingredients[(number + shift) % len(ingredients)],
+                amount=shift + 1,
+            )
+            for shift in range(3)
+        )
+        recipes.append(recipe)
+    return authors, recipes
+
+
+class RecipeListQueriesTest(APITestCase):
+    """Число запросов списка рецептов не зависит от размера страницы"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.authors, recipes = create_recipes()
+        cls.user = User.objects.create_user(
+            email='reader@example.com',
+            username='reader',
+            first_name='Читатель',
+            last_name='Рецептов',
+            password='Password12345!',
+        )
+        Follow.objects.create(user=cls.user, following=cls.authors[0])
+        for recipe in recipes[::2]:
+            Favorite.objects.create(user=cls.user, recipe=recipe)
+        for recipe in recipes[::3]:
+            ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+
+    def setUp(self):
+        cache.clear()
+        # Справочник тегов строится при первом обращении
+        self.client.get('/api/tags/')
+
+    def assert_list_queries(self, count):
+        results = []
+        for limit in (5, 25):
+            with self.subTest(limit=limit), self.assertNumQueries(count):
+                response = self.client.get(
+                    '/api/recipes/', {'limit': limit}
+                )
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data['results']), limit)
+            results = response.data['results']
+        return results
+
+    def test_anonymous(self):
+        self.assert_list_queries(5)
+
+    def test_authenticated(self):
+        self.client.force_authenticate(self.user)
+        results = self.assert_list_queries(5)
+        self.assertTrue(any(recipe['is_favorited'] for recipe in results))
+        self.assertTrue(
+            any(recipe['is_in_shopping_cart'] for recipe in results)
+        )
+        self.assertTrue(
+            any(recipe['author']['is_subscribed'] for recipe in results)
+        )
+
+
+class SubscriptionsQueriesTest(APITestCase):
+    """Число запросов списка подписок не зависит от числа авторов и
+    рецептов"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.authors, _ = create_recipes()
+        cls.user = User.objects.create_user(
+            email='reader@example.com',
+            username='reader',
+            first_name='Читатель',
+            last_name='Рецептов',
+            password='Password12345!',
+        )
+        for author in cls.authors:
+            Follow.objects.create(user=cls.user, following=author)
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def test_page_and_recipes_limit(self):
+        for limit, recipes_limit in ((1, 2), (3, 8)):
+            with self.subTest(limit=limit, recipes_limit=recipes_limit), \
+                    self.assertNumQueries(3):
+                response = self.client.get(
+                    '/api/users/subscriptions/',
+                    {'limit': limit, 'recipes_limit': recipes_limit},
+                )
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data['results']), limit)
+            for author in response.data['results']:
+                self.assertEqual(len(author['recipes']), recipes_limit)
+
+    def test_invalid_recipes_limit(self):
+        for recipes_limit in ('x', '-1'):
+            with self.subTest(recipes_limit=recipes_limit):
+                response = self.client.get(
+                    '/api/users/subscriptions/',
+                    {'recipes_limit': recipes_limit},
+                )
+                self.assertEqual(response.status_code, 400)
+
+
+@override_settings(REPLICA_DATABASES=[REPLICA])
+class ReplicaRoutingTest(APITransactionTestCase):
+    """Чтение с реплики и закрепление за основной базой после записи.
+
+    Внутри транзакции чтение всегда идет в основную базу, поэтому тесты
+    не оборачиваются в транзакцию.
+    """
+    databases = {DEFAULT_DB_ALIAS, REPLICA}
+
+    def setUp(self):
+        self.authors, self.recipes = create_recipes(5)
+        self.user = self.authors[0]
+        cache.clear()
+        replica_pool._ejected.clear()
+        self.client.get('/api/tags/')
+
+    def request(self, method, url, **kwargs):
+        """Ответ и запросы, выполненные в основной базе и в реплике"""
+        with CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as primary, \
+                CaptureQueriesContext(connections[REPLICA]) as replica:
+            response = getattr(self.client, method)(url, **kwargs)
+        return response, primary.captured_queries, replica.captured_queries
+
+    def test_safe_reads_use_replica(self):
+        self.client.force_authenticate(self.user)
+        for url in ('/api/recipes/',
+                    f'/api/recipes/{self.recipes[0].pk}/',
+                    '/api/users/'):
+            with self.subTest(url=url):
+                response, primary, replica = self.request('get', url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(primary, [])
+                self.assertNotEqual(replica, [])
+
+    def test_writes_use_primary(self):
+        self.client.force_authenticate(self.user)
+        response, primary, replica = self.request(
+            'post', f'/api/recipes/{self.recipes[1].pk}/favorite/'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(any(
+            query['sql'].startswith('INSERT') for query in primary
+        ))
+        self.assertEqual(replica, [])
+        self.assertTrue(
+            Favorite.objects.filter(
+                user=self.user, recipe=self.recipes[1]
+            ).exists()
+        )
+
+    def test_user_is_pinned_to_primary_after_write(self):
+        self.client.force_authenticate(self.user)
+        self.request('post', f'/api/recipes/{self.recipes[1].pk}/favorite/')
+        response, primary, replica = self.request(
+            'get', '/api/recipes/', data={'is_favorited': 1}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 1)
+        self.assertNotEqual(primary, [])
+        self.assertEqual(replica, [])
+        # Другие пользователи по-прежнему читают с реплики
+        self.client.force_authenticate(self.authors[1])
+        _, primary, replica = self.request('get', '/api/recipes/')
+        self.assertEqual(primary, [])
+        self.assertNotEqual(replica, [])
+
+    def test_reads_outside_request_use_primary(self):
+        self.request('get', '/api/recipes/')
+        self.assertEqual(router.db_for_read(Recipe), DEFAULT_DB_ALIAS)
+        with CaptureQueriesContext(connections[REPLICA]) as replica:
+            self.assertEqual(Recipe.objects.count(), len(self.recipes))
+        self.assertEqual(replica.captured_queries, [])
+
+    def test_unhealthy_replica_is_ejected(self):
+        with mock.patch.object(replica_pool, 'is_healthy',
+                               return_value=False) as is_healthy:
+            _, primary, replica = self.request('get', '/api/recipes/')
+            self.request('get', '/api/recipes/')
+        self.assertNotEqual(primary, [])
+        self.assertEqual(replica, [])
+        self.assertEqual(is_healthy.call_count, 1)
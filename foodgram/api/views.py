@@ -1,98 +1,217 @@
-from django.db.models import F, Q, Sum
-from django.http import HttpResponse
-from django.shortcuts import get_object_or_404
+from django.conf import settings
+from django.db.models import F, Prefetch, prefetch_related_objects
+from django.db.transaction import atomic
+from django.http import Http404, StreamingHttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
 
 from rest_framework import status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import JSONParser
 from rest_framework.permissions import AllowAny, IsAuthenticated, SAFE_METHODS
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework.viewsets import ModelViewSet
-from recipes.models import (Favorite, Ingredient,
-                            Recipe, ShoppingCart, Tag)
+from recipes.ingredient_index import ingredient_index
+from recipes.pantry import pantry_index
+from recipes.registry import tag_registry
+from recipes.relations import (add_relation, add_relations, remove_relation,
+                               remove_relations)
+from recipes.models import (Favorite, Ingredient, Recipe,
+                            ShoppingCart, ShoppingListItem, Tag)
+from recipes.versions import (INGREDIENTS_VERSION_KEY,
+                              RECIPE_DATA_VERSION_KEY, TAGS_VERSION_KEY,
+                              get_modified, get_version)
 from users.models import Follow, User
+from .cache import AnonymousResponseCacheMixin
+from .conditional import (ConditionalGetMixin, VersionedConditionalGetMixin,
+                          normalized_query, user_state)
 from .filters import RecipeFilter
-from .pagination import FoodgramPagination
+from .pagination import (FoodgramCursorPagination, FoodgramPagination,
+                         FoodgramPageNumberPagination)
+from .parsers import MultiPartJSONParser
 from .permissions import IsAuthorOrReadOnly
+from .renderers import SHOPPING_LIST_RENDERERS
+from .replicas import ReplicaReadMixin
 from .serializers import (FavoriteSerializer, FollowSerializer,
-                          IngredientSerializer, RecipeWriteSerializer,
-                          RecipeReadSerializer, ShoppingCartSerializer,
+                          IdListSerializer, IngredientSerializer,
+                          RecipePreviewSerializer,
+                          RecipeWriteSerializer, RecipeReadSerializer,
+                          SELF_FOLLOW_ERROR, ShoppingCartSerializer,
                           TagSerializer, SubscriptionsSerializer)
 
 
-class MyUserViewSet(UserViewSet):
+def parse_pk(value):
+    """Первичный ключ из URL; для нечислового значения - 404"""
+    if not str(value).isdigit():
+        raise Http404
+    return int(value)
+
+
+def parse_count(request, name):
+    """Целое неотрицательное число из параметра запроса или None"""
+    value = request.query_params.get(name)
+    if value is None:
+        return None
+    if not value.isdigit():
+        raise ValidationError(
+            {name: 'Ожидается целое неотрицательное число.'}
+        )
+    return int(value)
+
+
+def non_field_error(message):
+    return Response(
+        {api_settings.NON_FIELD_ERRORS_KEY: [message]},
+        status=status.HTTP_400_BAD_REQUEST,
+    )
+
+
+def unique_error(serializer_class):
+    """Ошибка в том же виде, что и от UniqueTogetherValidator сериализатора"""
+    return non_field_error(serializer_class.Meta.validators[0].message)
+
+
+@atomic
+def bulk_relations(request, model):
+    """Массовое добавление (POST) или удаление (DELETE) связей
+    пользователя с объектами из списка ids"""
+    serializer = IdListSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    ids = serializer.validated_data['ids']
+    if request.method == 'POST':
+        return Response(add_relations(model, request.user, ids))
+    return Response(remove_relations(model, request.user, ids))
+
+
+class MyUserViewSet(ReplicaReadMixin, UserViewSet):
     """Кастомный вьюсет пользователя"""
     pagination_class = FoodgramPagination
     http_method_names = ['get', 'post', 'delete']
 
+    def get_queryset(self):
+        return super().get_queryset().with_is_subscribed(self.request.user)
+
     def get_permissions(self):
-        if self.action in ('subscribe', 'subscriptions'):
+        if self.action in ('subscribe', 'subscribe_bulk', 'subscriptions'):
             return [IsAuthenticated()]
         return super().get_permissions()
 
     @action(detail=True, methods=['post'],
             pagination_class=FoodgramPagination)
     def subscribe(self, request, id=None):
-        author = get_object_or_404(User, pk=id)
-        data = {
-            'user': request.user.id,
-            'following': author.id
-        }
-        serializer = FollowSerializer(data=data, context={'request': request})
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
+        author_id = parse_pk(id)
+        if author_id == request.user.pk:
+            return non_field_error(SELF_FOLLOW_ERROR)
+        with atomic():
+            added = add_relation(Follow, request.user, author_id)
+        if added is None:
+            raise Http404
+        if not added:
+            return unique_error(FollowSerializer)
+        serializer = FollowSerializer(
+            Follow(user=request.user, following_id=author_id),
+            context={'request': request},
+        )
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @subscribe.mapping.delete
     def subscribe_delete(self, request, id=None):
-        author = get_object_or_404(User, pk=id)
-        follow = Follow.objects.filter(user=request.user, following=author)
-        if follow.exists():
-            follow.delete()
+        with atomic():
+            removed = remove_relation(Follow, request.user, parse_pk(id))
+        if removed is None:
+            raise Http404
+        if removed:
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response({
             'errors': 'Подписка уже отменена!'
         }, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=False, methods=['post', 'delete'], url_path='subscribe',
+            permission_classes=[IsAuthenticated])
+    def subscribe_bulk(self, request):
+        return bulk_relations(request, Follow)
+
     @action(detail=False, pagination_class=FoodgramPagination)
     def subscriptions(self, request, pk=None):
-        queryset = User.objects.filter(following__user=request.user)
+        recipes_limit = parse_count(request, 'recipes_limit')
+        queryset = User.objects.filter(
+            following__user=request.user
+        ).with_is_subscribed(request.user).order_by('username')
         page = self.paginate_queryset(queryset)
+        prefetch_related_objects(page, Prefetch(
+            'recipe_author',
+            queryset=Recipe.objects.latest_for_authors(page, recipes_limit),
+            to_attr='recipes_preview',
+        ))
         serializer = SubscriptionsSerializer(
             page, many=True, context={'request': request}
         )
         return self.get_paginated_response(serializer.data)
 
 
-class IngredientViewSet(ModelViewSet):
-    """Вьюсет ингредиентов"""
-    queryset = Ingredient.objects.all()
-    serializer_class = IngredientSerializer
+class ReferenceViewSet(VersionedConditionalGetMixin, ModelViewSet):
+    """Базовый вьюсет справочника, который читается из памяти процесса"""
+    registry = None
     http_method_names = ['get']
     permission_classes = [AllowAny]
     pagination_class = None
 
-    def get_queryset(self):
-        queryset = Ingredient.objects
-        name = self.request.query_params.get('name')
-        if name is not None:
-            queryset = queryset.filter(
-                Q(name__istartswith=name) | Q(name__icontains=name)
-            )
-        return queryset
+    def get_registry_items(self, request):
+        return self.registry.all()
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            self.list_from_registry, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            self.retrieve_from_registry, request, *args, **kwargs
+        )
+
+    def list_from_registry(self, request, *args, **kwargs):
+        return Response(self.get_registry_items(request))
+
+    def retrieve_from_registry(self, request, *args, **kwargs):
+        item = self.registry.get_item(
+            self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+        )
+        if item is None:
+            raise Http404
+        return Response(item)
 
 
-class TagViewSet(ModelViewSet):
+class IngredientViewSet(ReferenceViewSet):
+    """Вьюсет ингредиентов"""
+    registry = ingredient_index
+    version_key = INGREDIENTS_VERSION_KEY
+    queryset = Ingredient.objects.all()
+    serializer_class = IngredientSerializer
+
+    def get_registry_items(self, request):
+        name = request.query_params.get('name')
+        if name is None:
+            return super().get_registry_items(request)
+        limit = request.query_params.get('limit')
+        if limit is not None and limit.isdigit():
+            limit = int(limit)
+        else:
+            limit = settings.INGREDIENT_SEARCH_LIMIT
+        return ingredient_index.search(name, limit=limit)
+
+
+class TagViewSet(ReferenceViewSet):
     """Вьюсет тегов"""
+    registry = tag_registry
+    version_key = TAGS_VERSION_KEY
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
-    http_method_names = ['get']
-    permission_classes = [AllowAny]
-    pagination_class = None
 
 
-class RecipeViewSet(ModelViewSet):
+class RecipeViewSet(ReplicaReadMixin, ConditionalGetMixin,
+                    AnonymousResponseCacheMixin, ModelViewSet):
     """Вьюсет рецептов"""
     queryset = Recipe.objects.all()
     http_method_names = ['get', 'post', 'patch', 'delete']
@@ -100,6 +219,33 @@ class RecipeViewSet(ModelViewSet):
     permission_classes = [IsAuthorOrReadOnly]
     filter_backends = [DjangoFilterBackend]
     filterset_class = RecipeFilter
+    parser_classes = [JSONParser, MultiPartJSONParser]
+    multipart_json_fields = ('ingredients', 'tags')
+
+    def get_queryset(self):
+        if self.request.method in SAFE_METHODS:
+            return Recipe.objects.for_read(self.request.user)
+        return Recipe.objects.all()
+
+    def get_conditional_state(self, request, *args, **kwargs):
+        state, state_modified = user_state(request.user)
+        if self.action == 'retrieve':
+            updated_at = Recipe.objects.filter(
+                pk=parse_pk(kwargs['pk'])
+            ).values_list('updated_at', flat=True).first()
+            if updated_at is None:
+                return None
+            modified = [int(updated_at.timestamp()), state_modified]
+            return ((kwargs['pk'], updated_at.isoformat(), state),
+                    max(filter(None, modified)))
+        # Списки (страницы, курсор, лента) меняются только вместе с
+        # версией данных рецептов или состоянием пользователя, поэтому
+        # ETag вычисляется без запросов к базе данных.
+        return ((request.path, normalized_query(request),
+                 get_version(RECIPE_DATA_VERSION_KEY), state),
+                max(filter(None, [
+                    get_modified(RECIPE_DATA_VERSION_KEY), state_modified
+                ])))
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
@@ -109,23 +255,86 @@ class RecipeViewSet(ModelViewSet):
             return RecipeReadSerializer
         return RecipeWriteSerializer
 
+    @action(detail=False, permission_classes=[IsAuthenticated],
+            pagination_class=FoodgramCursorPagination)
+    def feed(self, request):
+        return self.conditional_response(self.feed_page, request)
+
+    def feed_page(self, request):
+        queryset = self.filter_queryset(
+            self.get_queryset().feed(request.user)
+        )
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=True, permission_classes=[AllowAny],
+            pagination_class=None)
+    def similar(self, request, pk=None):
+        return self.cached_response(
+            self.similar_list, request, pk=parse_pk(pk)
+        )
+
+    def similar_list(self, request, pk=None):
+        if not Recipe.objects.filter(pk=pk).exists():
+            raise Http404
+        recipes = Recipe.objects.filter(
+            similar_to__recipe_id=pk
+        ).order_by('-similar_to__score', '-pk')
+        serializer = RecipePreviewSerializer(
+            recipes, many=True, context={'request': request}
+        )
+        return Response(serializer.data)
+
+    @action(detail=False, permission_classes=[AllowAny],
+            pagination_class=FoodgramPageNumberPagination)
+    def pantry(self, request):
+        ingredient_ids = self.parse_ids(request, 'ingredients')
+        recipe_ids = pantry_index.search(
+            ingredient_ids,
+            missing=parse_count(request, 'missing') or 0,
+            tags=request.query_params.getlist('tags'),
+        )
+        page = self.paginate_queryset(recipe_ids)
+        recipes = Recipe.objects.for_read(request.user).in_bulk(page)
+        serializer = self.get_serializer(
+            [recipes[pk] for pk in page if pk in recipes], many=True
+        )
+        return self.get_paginated_response(serializer.data)
+
+    @staticmethod
+    def parse_ids(request, name):
+        """Целые числа из параметра вида ?name=1,2 или ?name=1&name=2"""
+        values = [
+            value for param in request.query_params.getlist(name)
+            for value in param.split(',') if value
+        ]
+        if not all(value.isdigit() for value in values):
+            raise ValidationError(
+                {name: 'Ожидаются целые неотрицательные числа.'}
+            )
+        return [int(value) for value in values]
+
+    @atomic
     def create_or_delete(self, request, pk, model, serializer, message):
-        user = request.user
-        recipe = get_object_or_404(Recipe, pk=pk)
-        instance = model.objects.filter(user=user, recipe=recipe)
+        recipe_id = parse_pk(pk)
         if request.method == 'POST':
-            data = {
-                'user': user.id,
-                'recipe': recipe.id
-            }
-            serializer = serializer(data=data, context={'request': request})
-            serializer.is_valid(raise_exception=True)
-            serializer.save()
+            added = add_relation(model, request.user, recipe_id)
+            if added is None:
+                raise Http404
+            if not added:
+                return unique_error(serializer)
+            serializer = serializer(
+                model(user=request.user, recipe_id=recipe_id),
+                context={'request': request},
+            )
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         if request.method == 'DELETE':
-            if not instance.exists():
+            removed = remove_relation(model, request.user, recipe_id)
+            if removed is None:
+                raise Http404
+            if not removed:
                 return Response(message, status=status.HTTP_400_BAD_REQUEST)
-            instance.delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response(status=status.HTTP_405_METHOD_NOT_ALLOWED)
 
@@ -151,23 +360,35 @@ class RecipeViewSet(ModelViewSet):
             message={'errors': 'Рецепта нет в списке покупок!'}
         )
 
-    @action(detail=False,
+    @action(detail=False, methods=['post', 'delete'], url_path='favorite',
             permission_classes=[IsAuthenticated])
+    def favorite_bulk(self, request):
+        return bulk_relations(request, Favorite)
+
+    @action(detail=False, methods=['post', 'delete'],
+            url_path='shopping_cart', permission_classes=[IsAuthenticated])
+    def shopping_cart_bulk(self, request):
+        return bulk_relations(request, ShoppingCart)
+
+    @action(detail=False,
+            permission_classes=[IsAuthenticated],
+            renderer_classes=SHOPPING_LIST_RENDERERS)
     def download_shopping_cart(self, request):
-        ingredients = Ingredient.objects.filter(
-            recipe__shopping_cart__user=request.user
+        ingredients = ShoppingListItem.objects.filter(
+            user=request.user
         ).values(
-            'name',
-            measurement=F('measurement_unit')
-        ).annotate(total=Sum('ingredients_list__amount')).order_by('-total')
-        shopping_list = ['Список покупок: ', ]
-        for num, item in enumerate(ingredients):
-            shopping_list.append(
-                f'{num + 1}. {item["name"]} = '
-                f'{item["total"]} {item["measurement"]}'
-            )
-        text = '\n'.join(shopping_list)
-        filename = 'foodgram_shopping_list.txt'
-        response = HttpResponse(text, content_type='text/plain')
+            'total',
+            name=F('ingredient__name'),
+            measurement=F('ingredient__measurement_unit')
+        ).order_by('-total')
+        renderer = request.accepted_renderer
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type = f'{content_type}; charset={renderer.charset}'
+        response = StreamingHttpResponse(
+            renderer.encode(renderer.stream(ingredients.iterator())),
+            content_type=content_type,
+        )
+        filename = f'foodgram_shopping_list.{renderer.extension}'
         response['Content-Disposition'] = f'attachment; filename={filename}'
         return response
@@ -111,6 +111,37 @@ if ENABLE_PROD:
         }
     }
 
+# Реплики для чтения: адреса через запятую в DB_REPLICA_HOSTS, остальные
+# параметры подключения совпадают с основной базой
+for number, host in enumerate(
+    filter(None, os.getenv('DB_REPLICA_HOSTS', default='').split(','))
+):
+    DATABASES[f'replica_{number}'] = {
+        **DATABASES['default'], 'HOST': host.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['recipes.replicas.PrimaryReplicaRouter']
+
+REPLICA_DATABASES = [alias for alias in DATABASES if alias != 'default']
+
+# Время после записи, в течение которого пользователь читает с основной
+# базы (должно превышать отставание реплик), секунды
+REPLICA_STICKY_SECONDS = 10
+
+# Время, на которое недоступная реплика исключается из пула, секунды
+REPLICA_EJECT_SECONDS = 30
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', default=''),
+    }
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -137,7 +168,7 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend'
@@ -208,3 +239,54 @@ NAME_MAX_LENGTH = 150
 
 # Максимальная длина поля Email
 EMAIL_MAX_LENGTH = 254
+
+# Максимальное число подсказок при поиске ингредиента по названию,
+# None - без ограничения
+INGREDIENT_SEARCH_LIMIT = None
+
+# Минимальное триграммное сходство названия рецепта с поисковым запросом
+TRIGRAM_SIMILARITY_THRESHOLD = 0.3
+
+# Шрифт с кириллицей для выгрузки списка покупок в PDF
+PDF_FONT_PATH = os.getenv(
+    'PDF_FONT_PATH',
+    default='/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
+# Время жизни кэшированных ответов API для анонимных пользователей, секунды
+RESPONSE_CACHE_TIMEOUT = 60
+
+# Размеры уменьшенных копий фото рецептов (ширина, высота)
+RECIPE_IMAGE_SIZES = {
+    'thumbnail': (320, 240),
+    'card': (640, 480),
+}
+
+# Число потоков для обработки фото рецептов
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', default=2))
+
+# Максимальный размер фото рецепта, байты
+RECIPE_IMAGE_MAX_SIZE = 10 * 2 ** 20
+
+# Число строк, начиная с которого админка показывает приблизительное
+# количество записей из статистики PostgreSQL вместо COUNT(*)
+ADMIN_ESTIMATED_COUNT_THRESHOLD = 100000
+
+# Рецепты авторов, у которых подписчиков больше этого числа, не копируются
+# в ленты подписчиков, а выбираются по подпискам при чтении ленты
+FEED_FANOUT_MAX_FOLLOWERS = 10000
+
+# Число записей ленты в одном INSERT при рассылке рецепта подписчикам
+FEED_FANOUT_BATCH_SIZE = 1000
+
+# Число похожих рецептов, которые хранятся для каждого рецепта
+SIMILAR_RECIPES_COUNT = 10
+
+# Максимальное число объектов в одном запросе на массовое добавление
+# в избранное, корзину или подписки
+BULK_RELATIONS_MAX_ITEMS = 100
+
+# Кэш токенов авторизации: число записей в памяти процесса и время жизни
+# записи (в памяти и в общем кэше), секунды
+AUTH_TOKEN_CACHE_SIZE = 10000
+AUTH_TOKEN_CACHE_TIMEOUT = 300
@@ -0,0 +1,22 @@
+"""Настройки для тестов: две базы SQLite - основная и реплика.
+
+Реплика в тестах - зеркало основной базы (TEST['MIRROR']), поэтому видит
+те же данные, но запросы к ней идут через отдельное подключение. Чтение с
+реплики включается в тестах через override_settings(REPLICA_DATABASES).
+"""
+from .settings import *  # noqa: F401, F403
+from .settings import BASE_DIR
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.sqlite3',
+    },
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.sqlite3',
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+
+REPLICA_DATABASES = []
@@ -1,7 +1,35 @@
 from django.contrib import admin
+from django.db.models import Prefetch
 
+from users.models import User
 from .models import (Ingredient, RecipeIngredient, Tag,
                      Recipe, Favorite, ShoppingCart)
+from .pagination import EstimatedCountPaginator
+
+
+class AuthorFilter(admin.SimpleListFilter):
+    """Фильтр по автору, не загружающий список всех пользователей.
+
+    В боковой панели показывается только выбранный автор; выбрать его
+    можно по ссылке с числом рецептов в списке пользователей.
+    """
+    title = 'Автор'
+    parameter_name = 'author'
+
+    def lookups(self, request, model_admin):
+        if not (self.value() or '').isdigit():
+            return ()
+        return [
+            (str(pk), username) for pk, username
+            in User.objects.filter(pk=self.value()).values_list(
+                'pk', 'username'
+            )
+        ]
+
+    def queryset(self, request, queryset):
+        if (self.value() or '').isdigit():
+            return queryset.filter(author_id=self.value())
+        return queryset
 
 
 # Register your models here.
@@ -16,7 +44,9 @@ class IngredientAdmin(admin.ModelAdmin):
     fields = ('name',)
     ordering = ('name',)
     search_fields = ('name',)
-    list_filter = ('name',)
+    list_filter = ('measurement_unit',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(RecipeIngredient)
@@ -27,8 +57,11 @@ class RecipeIngredientAdmin(admin.ModelAdmin):
         'ingredient',
         'amount'
     )
-    search_fields = ('recipe', 'ingredient')
-    list_filter = ('recipe', 'ingredient')
+    list_select_related = ('recipe', 'ingredient')
+    search_fields = ('recipe__name', 'ingredient__name')
+    autocomplete_fields = ('recipe', 'ingredient')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(Tag)
@@ -46,6 +79,7 @@ class IngredientRecipeInline(admin.TabularInline):
     model = RecipeIngredient
     extra = 0
     min_num = 1
+    autocomplete_fields = ('ingredient',)
 
 
 @admin.register(Recipe)
@@ -61,17 +95,26 @@ class RecipeAdmin(admin.ModelAdmin):
         'ingredients_in_recipe'
     )
     list_display_links = ('name',)
+    list_select_related = ('author',)
     fields = ('name', 'text',
               'author', 'image',
               'tags', 'cooking_time')
-    search_fields = ('name', 'author')
-    list_filter = ('name', 'author', 'tags')
+    search_fields = ('name', 'author__username', 'author__email')
+    list_filter = (AuthorFilter, 'tags')
     empty_value_display = '-пусто-'
     readonly_fields = ('author', 'is_favorited')
+    autocomplete_fields = ('tags',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related(Prefetch(
+            'ingredients', queryset=Ingredient.objects.only('name')
+        ))
 
-    @admin.display(description='В избранном')
+    @admin.display(description='В избранном', ordering='favorites_count')
     def is_favorited(self, obj):
-        return obj.favorite.count()
+        return obj.favorites_count
 
     @admin.display(description='Ингредиенты')
     def ingredients_in_recipe(self, obj):
@@ -83,18 +126,26 @@ class RecipeAdmin(admin.ModelAdmin):
 @admin.register(Favorite)
 class FavoriteAdmin(admin.ModelAdmin):
     list_display = ('pk', 'user', 'recipe')
+    list_select_related = ('user', 'recipe')
     search_fields = (
         'user__username',
         'user__email',
         'recipe__name'
     )
+    autocomplete_fields = ('user', 'recipe')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(ShoppingCart)
 class ShoppingCartAdmin(admin.ModelAdmin):
     list_display = ('pk', 'user', 'recipe')
+    list_select_related = ('user', 'recipe')
     search_fields = (
         'user__username',
         'user__email',
         'recipe__name'
     )
+    autocomplete_fields = ('user', 'recipe')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
@@ -0,0 +1,60 @@
+"""Массовая загрузка строк в таблицы для команд импорта."""
+import csv
+from io import StringIO
+
+from django.db import connection
+
+
+def supports_copy():
+    return connection.vendor == 'postgresql'
+
+
+def copy_rows(table, columns, rows):
+    """Загружает строки через COPY ... FROM STDIN (только PostgreSQL)"""
+    buffer = StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    quote = connection.ops.quote_name
+    column_list = ', '.join(quote(column) for column in columns)
+    with connection.cursor() as cursor:
+        cursor.copy_expert(
+            f'COPY {quote(table)} ({column_list}) '
+            f'FROM STDIN WITH (FORMAT csv)',
+            buffer,
+        )
+
+
+def insert_rows(model, columns, rows, use_copy=True, batch_size=None):
+    """Вставляет строки через COPY, если он доступен, иначе bulk_create"""
+    if use_copy and supports_copy():
+        copy_rows(model._meta.db_table, columns, rows)
+        return
+    model.objects.bulk_create(
+        (model(**dict(zip(columns, row))) for row in rows),
+        batch_size=batch_size,
+    )
+
+
+def copy_rows_ignore_conflicts(table, columns, rows):
+    """Загружает строки через COPY во временную таблицу и переносит их
+    в основную с ON CONFLICT DO NOTHING (только PostgreSQL).
+
+    Возвращает число добавленных строк. Должна вызываться в транзакции.
+    """
+    quote = connection.ops.quote_name
+    staging = f'{table}_staging'
+    column_list = ', '.join(quote(column) for column in columns)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE TEMP TABLE IF NOT EXISTS {quote(staging)} AS '
+            f'SELECT {column_list} FROM {quote(table)} WITH NO DATA'
+        )
+        copy_rows(staging, columns, rows)
+        cursor.execute(
+            f'INSERT INTO {quote(table)} ({column_list}) '
+            f'SELECT DISTINCT {column_list} FROM {quote(staging)} '
+            f'ON CONFLICT DO NOTHING'
+        )
+        inserted = cursor.rowcount
+        cursor.execute(f'TRUNCATE {quote(staging)}')
+    return inserted
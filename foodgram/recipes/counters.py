@@ -0,0 +1,71 @@
+"""Денормализованные счетчики популярности и активности.
+
+Счетчики хранятся в столбцах Recipe и User и меняются атомарным
+UPDATE ... SET count = count + 1 в той же транзакции, что и запись,
+которую они считают. Расхождения, например после массовой загрузки
+в обход сигналов, исправляет команда reconcile_counters.
+"""
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from users.models import Follow, User
+from .models import Favorite, Recipe, ShoppingCart
+
+# Считаемая модель: (модель со счетчиком, поле счетчика, внешний ключ)
+COUNTERS = {
+    Favorite: (Recipe, 'favorites_count', 'recipe'),
+    ShoppingCart: (Recipe, 'in_carts_count', 'recipe'),
+    Recipe: (User, 'recipes_count', 'author'),
+    Follow: (User, 'followers_count', 'following'),
+}
+
+
+def change_counter(related, pk, delta):
+    """Прибавляет delta к счетчику объекта pk, на который ссылается
+    запись модели related"""
+    model, field, _ = COUNTERS[related]
+    model.objects.filter(pk=pk).update(
+        **{field: Greatest(F(field) + delta, 0)}
+    )
+
+
+def change_counters(related, pks, delta):
+    """Прибавляет delta к счетчикам всех объектов pks одним запросом"""
+    model, field, _ = COUNTERS[related]
+    model.objects.filter(pk__in=pks).update(
+        **{field: Greatest(F(field) + delta, 0)}
+    )
+
+
+def record_counted(instance, delta):
+    """Учитывает создание (delta=1) или удаление (delta=-1) записи"""
+    _, _, foreign_key = COUNTERS[type(instance)]
+    change_counter(
+        type(instance), getattr(instance, f'{foreign_key}_id'), delta
+    )
+
+
+def actual_count(related):
+    """Выражение с настоящим числом записей related для объекта"""
+    _, _, foreign_key = COUNTERS[related]
+    return Coalesce(Subquery(
+        related.objects.filter(**{foreign_key: OuterRef('pk')})
+        .order_by().values(foreign_key)
+        .annotate(count=Count('pk')).values('count')
+    ), 0)
+
+
+def drifted(related):
+    """Объекты, у которых счетчик не совпадает с числом записей"""
+    model, field, _ = COUNTERS[related]
+    return model.objects.annotate(
+        actual=actual_count(related)
+    ).exclude(**{field: F('actual')}).order_by('pk')
+
+
+def reconcile(related, pks):
+    """Пересчитывает счетчик у объектов pks"""
+    model, field, _ = COUNTERS[related]
+    return model.objects.filter(pk__in=pks).update(
+        **{field: actual_count(related)}
+    )
@@ -0,0 +1,106 @@
+"""Лента рецептов от авторов, на которых подписан пользователь.
+
+Новый рецепт сразу копируется в ленты подписчиков автора (FeedEntry),
+поэтому чтение ленты - это выборка по индексу без объединения подписок.
+Для авторов с очень большим числом подписчиков копирование слишком
+дорогое: их рецепты добавляются к ленте при чтении (RecipeQuerySet.feed).
+"""
+from itertools import islice
+
+from django.conf import settings
+
+from users.models import Follow
+from .models import FeedEntry, Recipe
+
+
+def insert_entries(entries):
+    entries = iter(entries)
+    while True:
+        batch = list(islice(entries, settings.FEED_FANOUT_BATCH_SIZE))
+        if not batch:
+            return
+        FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def fan_out(recipe):
+    """Добавляет новый рецепт в ленты подписчиков автора"""
+    fan_out_recipes([recipe])
+
+
+def fan_out_recipes(recipes):
+    """Добавляет новые рецепты в ленты подписчиков их авторов: подписчики
+    всех авторов выбираются одним запросом"""
+    by_author = {}
+    for recipe in recipes:
+        by_author.setdefault(recipe.author_id, []).append(recipe.pk)
+    followers = Follow.objects.filter(
+        following_id__in=by_author,
+        following__followers_count__lte=settings.FEED_FANOUT_MAX_FOLLOWERS,
+    ).values_list('user_id', 'following_id')
+    insert_entries(
+        FeedEntry(user_id=user_id, recipe_id=recipe_id, author_id=author_id)
+        for user_id, author_id in followers.iterator()
+        for recipe_id in by_author[author_id]
+    )
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту рецепты автора после подписки на него"""
+    backfill_authors(user_id, [author_id])
+
+
+def backfill_authors(user_id, author_ids):
+    """Добавляет в ленту рецепты нескольких авторов одним запросом"""
+    recipes = Recipe.objects.filter(
+        author_id__in=author_ids,
+        author__followers_count__lte=settings.FEED_FANOUT_MAX_FOLLOWERS,
+    ).values_list('pk', 'author_id')
+    insert_entries(
+        FeedEntry(user_id=user_id, recipe_id=recipe_id, author_id=author_id)
+        for recipe_id, author_id in recipes.iterator()
+    )
+
+
+def prune(user_id, author_id):
+    """Убирает из ленты рецепты автора после отписки"""
+    prune_authors(user_id, [author_id])
+
+
+def prune_authors(user_id, author_ids):
+    """Вызывается после уменьшения счетчиков подписчиков авторов"""
+    FeedEntry.objects.filter(
+        user_id=user_id, author_id__in=author_ids
+    ).delete()
+    restore_authors(author_ids)
+
+
+def restore_authors(author_ids):
+    """Заполняет ленты всех подписчиков авторов, у которых число
+    подписчиков только что опустилось до FEED_FANOUT_MAX_FOLLOWERS.
+
+    Пока подписчиков было больше, ни новые подписки, ни новые рецепты
+    этих авторов в ленты не копировались, а теперь рецепты перестают
+    добавляться при чтении.
+    """
+    rows = Follow.objects.filter(
+        following_id__in=author_ids,
+        following__followers_count=settings.FEED_FANOUT_MAX_FOLLOWERS,
+        following__recipe_author__isnull=False,
+    ).values_list('user_id', 'following_id', 'following__recipe_author')
+    insert_entries(
+        FeedEntry(user_id=user_id, recipe_id=recipe_id, author_id=author_id)
+        for user_id, author_id, recipe_id in rows.iterator()
+    )
+
+
+def rebuild():
+    """Заполняет ленты заново по текущим подпискам"""
+    FeedEntry.objects.all().delete()
+    rows = Follow.objects.filter(
+        following__followers_count__lte=settings.FEED_FANOUT_MAX_FOLLOWERS,
+        following__recipe_author__isnull=False,
+    ).values_list('user_id', 'following_id', 'following__recipe_author')
+    insert_entries(
+        FeedEntry(user_id=user_id, recipe_id=recipe_id, author_id=author_id)
+        for user_id, author_id, recipe_id in rows.iterator()
+    )
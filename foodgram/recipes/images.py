@@ -0,0 +1,123 @@
+"""Уменьшенные копии фото рецептов.
+
+Для каждого фото строятся копии фиксированных размеров в JPEG и WebP
+(и AVIF, если Pillow его поддерживает). Обработка выполняется в пуле
+потоков после фиксации транзакции, а не в потоке запроса; имена готовых
+файлов сохраняются в Recipe.image_variants.
+"""
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from threading import Lock
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .models import Recipe
+from .versions import RECIPE_DATA_VERSION_KEY, bump_version
+
+logger = logging.getLogger(__name__)
+
+VARIANTS_DIR = 'recipe_pics/variants'
+FORMATS = {
+    'jpeg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+    'webp': ('WEBP', {'quality': 80, 'method': 6}),
+    'avif': ('AVIF', {'quality': 60}),
+}
+
+_executor = None
+_executor_lock = Lock()
+
+
+def available_formats():
+    Image.init()
+    return [name for name, (pil_format, _) in FORMATS.items()
+            if pil_format in Image.SAVE]
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_WORKERS,
+                thread_name_prefix='recipe-images',
+            )
+    return _executor
+
+
+def variant_name(image_name, size_name, format_name):
+    stem = os.path.splitext(os.path.basename(image_name))[0]
+    return f'{VARIANTS_DIR}/{stem}_{size_name}.{format_name}'
+
+
+def render_variants(image_name):
+    """Строит копии фото и возвращает {размер: {формат: имя файла}}"""
+    with default_storage.open(image_name, 'rb') as file:
+        original = ImageOps.exif_transpose(Image.open(file))
+        original.load()
+    if original.mode not in ('RGB', 'RGBA'):
+        original = original.convert('RGBA')
+    variants = {}
+    for size_name, size in settings.RECIPE_IMAGE_SIZES.items():
+        image = ImageOps.fit(original, size, Image.Resampling.LANCZOS)
+        variants[size_name] = {}
+        for format_name in available_formats():
+            pil_format, options = FORMATS[format_name]
+            converted = image
+            if pil_format == 'JPEG' and image.mode != 'RGB':
+                converted = image.convert('RGB')
+            buffer = BytesIO()
+            converted.save(buffer, pil_format, **options)
+            name = variant_name(image_name, size_name, format_name)
+            if default_storage.exists(name):
+                default_storage.delete(name)
+            variants[size_name][format_name] = default_storage.save(
+                name, ContentFile(buffer.getvalue())
+            )
+    return variants
+
+
+def _stored_names(variants):
+    return {name for formats in variants.values()
+            for name in formats.values()}
+
+
+def process_recipe_image(recipe_id, image_name):
+    """Задача пула: строит копии и сохраняет их имена в рецепте"""
+    try:
+        previous = Recipe.objects.filter(pk=recipe_id).values_list(
+            'image_variants', flat=True
+        ).first()
+        variants = render_variants(image_name)
+        updated = Recipe.objects.filter(
+            pk=recipe_id, image=image_name
+        ).update(image_variants=variants, updated_at=timezone.now())
+        if updated:
+            bump_version(RECIPE_DATA_VERSION_KEY)
+        stale = _stored_names(previous or {}) - _stored_names(variants)
+        if not updated:
+            stale = _stored_names(variants)
+        for name in stale:
+            default_storage.delete(name)
+        return variants
+    except Exception:
+        logger.exception('Не удалось обработать фото рецепта %s', recipe_id)
+        raise
+    finally:
+        connections.close_all()
+
+
+def schedule_image_variants(recipe):
+    """Ставит обработку фото в очередь после фиксации транзакции"""
+    recipe_id, image_name = recipe.pk, recipe.image.name
+    transaction.on_commit(
+        lambda: get_executor().submit(
+            process_recipe_image, recipe_id, image_name
+        )
+    )
@@ -0,0 +1,96 @@
+"""Индекс ингредиентов в памяти процесса для автодополнения.
+
+Каталог ингредиентов небольшой и меняется редко, поэтому он целиком
+держится в памяти: отсортированный массив названий для поиска по
+префиксу и триграммный индекс для поиска по подстроке. Актуальность
+индекса определяется меткой версии в общем кэше, которую сигналы меняют
+при любом изменении ингредиентов.
+"""
+from bisect import bisect_left
+
+from .models import Ingredient
+from .registry import VersionedRegistry
+from .versions import INGREDIENTS_VERSION_KEY
+
+TRIGRAM_SIZE = 3
+
+
+def _trigrams(text):
+    return {
+        text[i:i + TRIGRAM_SIZE]
+        for i in range(len(text) - TRIGRAM_SIZE + 1)
+    }
+
+
+class _Snapshot:
+    """Неизменяемый срез каталога, по которому выполняется поиск"""
+
+    def __init__(self, version, rows):
+        rows = sorted(
+            (name.lower(), pk, name, measurement_unit)
+            for pk, name, measurement_unit in rows
+        )
+        self.version = version
+        self.keys = [row[0] for row in rows]
+        self.items = [
+            {'id': pk, 'name': name, 'measurement_unit': measurement_unit}
+            for _, pk, name, measurement_unit in rows
+        ]
+        self.by_pk = {item['id']: item for item in self.items}
+        self.trigrams = {}
+        for position, key in enumerate(self.keys):
+            for trigram in _trigrams(key):
+                self.trigrams.setdefault(trigram, []).append(position)
+
+    def prefix_positions(self, query):
+        position = bisect_left(self.keys, query)
+        while (position < len(self.keys)
+               and self.keys[position].startswith(query)):
+            yield position
+            position += 1
+
+    def substring_positions(self, query):
+        if len(query) < TRIGRAM_SIZE:
+            candidates = range(len(self.keys))
+        else:
+            postings = sorted(
+                (self.trigrams.get(trigram, ())
+                 for trigram in _trigrams(query)),
+                key=len,
+            )
+            candidates = set(postings[0])
+            for posting in postings[1:]:
+                candidates.intersection_update(posting)
+            candidates = sorted(candidates)
+        for position in candidates:
+            key = self.keys[position]
+            if query in key and not key.startswith(query):
+                yield position
+
+
+class IngredientIndex(VersionedRegistry):
+    """Поиск ингредиентов по названию без обращения к базе данных"""
+    model = Ingredient
+    version_key = INGREDIENTS_VERSION_KEY
+
+    def build(self, version):
+        return _Snapshot(
+            version,
+            Ingredient.objects.values_list('pk', 'name', 'measurement_unit'),
+        )
+
+    def search(self, query, limit=None):
+        """Сначала совпадения по префиксу, затем по подстроке"""
+        query = query.lower()
+        snapshot = self.get_snapshot()
+        result = []
+        for positions in (snapshot.prefix_positions(query),
+                          snapshot.substring_positions(query)):
+            for position in positions:
+                if limit is not None and len(result) >= limit:
+                    return result
+                result.append(snapshot.items[position])
+        return result
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,35 @@
+import os
+import time
+
+from django.core.management import BaseCommand
+
+from recipes.transfer import dump_rows, file_name, get_models, open_dump
+
+
+class Command(BaseCommand):
+    help = 'Выгрузка данных в каталог: файл NDJSON на каждую модель'
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='Каталог для выгрузки')
+        parser.add_argument(
+            '--gzip', action='store_true', help='Сжимать файлы gzip',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=2000,
+            help='Число строк, читаемых из базы за один раз',
+        )
+
+    def handle(self, *args, **options):
+        os.makedirs(options['directory'], exist_ok=True)
+        for model in get_models():
+            path = os.path.join(
+                options['directory'], file_name(model, options['gzip'])
+            )
+            started = time.monotonic()
+            with open_dump(path, 'w') as file:
+                count = dump_rows(model, file, options['chunk_size'])
+            self.stdout.write(
+                f'{model._meta.label}: {count} строк '
+                f'за {time.monotonic() - started:.1f} с'
+            )
+        self.stdout.write(self.style.SUCCESS('Данные выгружены!'))
@@ -0,0 +1,37 @@
+from concurrent.futures import as_completed
+
+from django.core.management import BaseCommand
+
+from recipes.images import get_executor, process_recipe_image
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Создание уменьшенных копий фото для существующих рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Пересоздать копии и для рецептов, у которых они уже есть',
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='')
+        if not options['all']:
+            recipes = recipes.filter(image_variants={})
+        tasks = [
+            get_executor().submit(process_recipe_image, pk, image)
+            for pk, image in recipes.values_list('pk', 'image').iterator()
+        ]
+        failed = 0
+        for done, task in enumerate(as_completed(tasks), start=1):
+            if task.exception() is not None:
+                failed += 1
+            if done % 100 == 0 or done == len(tasks):
+                self.stdout.write(f'Обработано {done} из {len(tasks)}')
+        if failed:
+            self.stdout.write(self.style.WARNING(
+                f'Не удалось обработать фото: {failed}'
+            ))
+        self.stdout.write(self.style.SUCCESS('Копии фото созданы'))
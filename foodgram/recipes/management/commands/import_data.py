@@ -0,0 +1,92 @@
+import time
+from itertools import islice
+
+from django.core.management import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection
+from django.db.transaction import atomic
+
+from recipes.ingredient_index import ingredient_index
+from recipes.models import Recipe
+from recipes.pantry import pantry_index
+from recipes.registry import tag_registry
+from recipes.search import update_search_index_bulk
+from recipes.transfer import (OPTIONAL_MODELS, find_dump, get_models,
+                              open_dump, read_objects)
+from recipes.versions import RECIPE_DATA_VERSION_KEY, bump_version_on_commit
+
+
+class Command(BaseCommand):
+    help = (
+        'Загрузка данных, выгруженных командой export_data. Если в '
+        'выгрузке нет токенов, лент или похожих рецептов, пользователям '
+        'нужно войти заново, а ленты и похожие рецепты - пересчитать '
+        'командами rebuild_feed и rebuild_similar_recipes'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='Каталог с выгрузкой')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Число строк в одном INSERT',
+        )
+        parser.add_argument(
+            '--ignore-conflicts', action='store_true',
+            help='Пропускать строки, которые уже есть в базе',
+        )
+
+    def handle(self, *args, **options):
+        models = get_models()
+        paths = {model: find_dump(options['directory'], model)
+                 for model in models}
+        missing = [model._meta.label for model, path in paths.items()
+                   if path is None
+                   and model._meta.label_lower not in OPTIONAL_MODELS]
+        if missing:
+            raise CommandError(f'Нет файлов для моделей: {", ".join(missing)}')
+        skipped = [model for model, path in paths.items() if path is None]
+        with atomic():
+            for model in models:
+                if paths[model] is None:
+                    continue
+                started = time.monotonic()
+                with open_dump(paths[model], 'r') as file:
+                    count = self.load(
+                        model, read_objects(model, file), options
+                    )
+                self.stdout.write(
+                    f'{model._meta.label}: {count} строк '
+                    f'за {time.monotonic() - started:.1f} с'
+                )
+            self.reset_sequences(models)
+            ingredient_index.invalidate()
+            tag_registry.invalidate()
+            pantry_index.invalidate()
+            bump_version_on_commit(RECIPE_DATA_VERSION_KEY)
+        for model in skipped:
+            self.stdout.write(self.style.WARNING(
+                f'Нет файла для {model._meta.label}: '
+                f'{OPTIONAL_MODELS[model._meta.label_lower]}'
+            ))
+        self.stdout.write(self.style.SUCCESS('Данные загружены!'))
+
+    def load(self, model, objects, options):
+        count = 0
+        while True:
+            batch = list(islice(objects, options['batch_size']))
+            if not batch:
+                return count
+            model.objects.bulk_create(
+                batch, ignore_conflicts=options['ignore_conflicts']
+            )
+            if model is Recipe:
+                update_search_index_bulk(
+                    Recipe.objects.filter(pk__in=[obj.pk for obj in batch])
+                )
+            count += len(batch)
+
+    def reset_sequences(self, models):
+        statements = connection.ops.sequence_reset_sql(no_style(), models)
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
@@ -0,0 +1,250 @@
+import base64
+import json
+import os
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import BaseCommand, CommandError
+from django.db.transaction import atomic
+
+from recipes.bulk import insert_rows
+from recipes.counters import change_counter
+from recipes.feed import fan_out_recipes
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from recipes.pantry import pantry_index
+from recipes.search import update_search_index_bulk
+from recipes.versions import RECIPE_DATA_VERSION_KEY, bump_version
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Загрузка рецептов из NDJSON: по одному объекту на строку с полями '
+        'author (email), name, text, cooking_time, tags (слаги), '
+        'ingredients ([{name, measurement_unit, amount}] или '
+        '[{id, amount}]) и image (путь к файлу или data:...;base64)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл NDJSON')
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Число рецептов в одной транзакции',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='Число потоков для сохранения фото',
+        )
+        parser.add_argument(
+            '--images-dir', default='.',
+            help='Каталог, относительно которого указаны пути к фото',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='Файл с номером последней загруженной строки '
+                 '(по умолчанию <path>.checkpoint)',
+        )
+        parser.add_argument(
+            '--no-copy', action='store_true',
+            help='Не использовать COPY на PostgreSQL',
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.authors = dict(User.objects.values_list('email', 'pk'))
+        self.tags = dict(Tag.objects.values_list('slug', 'pk'))
+        self.ingredients = {
+            (name, unit): pk for pk, name, unit
+            in Ingredient.objects.values_list(
+                'pk', 'name', 'measurement_unit'
+            ).iterator()
+        }
+        self.ingredient_ids = set(self.ingredients.values())
+        checkpoint_path = (options['checkpoint']
+                           or f'{options["path"]}.checkpoint')
+        start_line = self.read_checkpoint(checkpoint_path)
+        imported = skipped = 0
+        started = time.monotonic()
+        try:
+            file = open(options['path'], encoding='utf-8')
+        except FileNotFoundError:
+            raise CommandError(f'Файл {options["path"]} не найден')
+        with file, ThreadPoolExecutor(options['workers']) as pool:
+            lines = islice(enumerate(file, start=1), start_line, None)
+            while True:
+                batch = list(islice(lines, options['batch_size']))
+                if not batch:
+                    break
+                batch_imported, batch_skipped = self.import_batch(
+                    batch, pool
+                )
+                imported += batch_imported
+                skipped += batch_skipped
+                self.write_checkpoint(checkpoint_path, batch[-1][0])
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f'Строка {batch[-1][0]}: загружено {imported}, '
+                    f'пропущено {skipped}, '
+                    f'{imported / elapsed if elapsed else 0:.0f} рецептов/с'
+                )
+        bump_version(RECIPE_DATA_VERSION_KEY)
+        pantry_index.invalidate()
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено рецептов: {imported}, пропущено: {skipped}. '
+            f'Для создания копий фото и поиска похожих рецептов запустите '
+            f'generate_image_variants и rebuild_similar_recipes.'
+        ))
+
+    def read_checkpoint(self, path):
+        if not os.path.exists(path):
+            return 0
+        with open(path, encoding='utf-8') as file:
+            line = int(file.read().strip() or 0)
+        self.stdout.write(f'Продолжение загрузки после строки {line}')
+        return line
+
+    def write_checkpoint(self, path, line):
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(str(line))
+
+    def warn(self, line_number, message):
+        self.stderr.write(f'Строка {line_number}: {message}')
+
+    def parse(self, line_number, line):
+        """Проверяет запись и заменяет ссылки на первичные ключи"""
+        try:
+            data = json.loads(line)
+            author_id = self.authors[data['author']]
+            tag_ids = {self.tags[slug] for slug in data['tags']}
+            amounts = {}
+            for item in data['ingredients']:
+                if 'id' in item:
+                    pk = item['id']
+                    if pk not in self.ingredient_ids:
+                        raise KeyError(pk)
+                else:
+                    pk = self.ingredients[
+                        (item['name'], item['measurement_unit'])
+                    ]
+                amounts[pk] = amounts.get(pk, 0) + int(item['amount'])
+            cooking_time = int(data['cooking_time'])
+            name, text, image = data['name'], data['text'], data['image']
+        except (ValueError, TypeError) as exc:
+            return self.warn(line_number, f'некорректная запись ({exc})')
+        except KeyError as exc:
+            return self.warn(line_number, f'не найдено: {exc}')
+        values = [cooking_time, *amounts.values()]
+        if not amounts or not tag_ids or any(
+            not settings.MIN_VALUE <= value <= settings.MAX_VALUE
+            for value in values
+        ):
+            return self.warn(line_number, 'недопустимые значения')
+        return {
+            'line': line_number,
+            'recipe': Recipe(
+                author_id=author_id, name=name, text=text,
+                cooking_time=cooking_time,
+            ),
+            'image': image,
+            'tags': tag_ids,
+            'amounts': amounts,
+        }
+
+    def store_image(self, source):
+        if source.startswith('data:'):
+            header, encoded = source.split(';base64,')
+            extension = header.split('/')[-1]
+            content = base64.b64decode(encoded)
+        else:
+            path = os.path.join(self.options['images_dir'], source)
+            extension = os.path.splitext(path)[1].lstrip('.')
+            with open(path, 'rb') as file:
+                content = file.read()
+        return default_storage.save(
+            f'recipe_pics/{uuid.uuid4()}.{extension}', ContentFile(content)
+        )
+
+    def import_batch(self, batch, pool):
+        entries = [entry for entry in (
+            self.parse(line_number, line)
+            for line_number, line in batch if line.strip()
+        ) if entry is not None]
+        existing = set(Recipe.objects.filter(
+            author_id__in={entry['recipe'].author_id for entry in entries},
+            name__in={entry['recipe'].name for entry in entries},
+        ).values_list('author_id', 'name'))
+        unique = {}
+        for entry in entries:
+            key = (entry['recipe'].author_id, entry['recipe'].name)
+            if key in existing or key in unique:
+                self.warn(entry['line'], 'рецепт уже существует')
+                continue
+            unique[key] = entry
+        entries = list(unique.values())
+        images = pool.map(
+            self.safe_store_image, [entry['image'] for entry in entries]
+        )
+        stored = []
+        for entry, image in zip(entries, images):
+            if image is None:
+                self.warn(entry['line'], 'не удалось сохранить фото')
+                continue
+            entry['recipe'].image = image
+            stored.append(entry)
+        with atomic():
+            self.insert(stored)
+        return len(stored), len(batch) - len(stored)
+
+    def safe_store_image(self, source):
+        try:
+            return self.store_image(source)
+        except (OSError, ValueError):
+            return None
+
+    def insert(self, entries):
+        if not entries:
+            return
+        recipes = Recipe.objects.bulk_create(
+            entry['recipe'] for entry in entries
+        )
+        if any(recipe.pk is None for recipe in recipes):
+            # Бэкенд не возвращает ключи из bulk_create (SQLite)
+            keys = {
+                (author_id, name): pk for author_id, name, pk
+                in Recipe.objects.filter(
+                    author_id__in={recipe.author_id for recipe in recipes},
+                    name__in={recipe.name for recipe in recipes},
+                ).values_list('author_id', 'name', 'pk')
+            }
+            for recipe in recipes:
+                recipe.pk = keys[(recipe.author_id, recipe.name)]
+        use_copy = not self.options['no_copy']
+        insert_rows(
+            RecipeIngredient,
+            ('recipe_id', 'ingredient_id', 'amount'),
+            [(entry['recipe'].pk, pk, amount)
+             for entry in entries for pk, amount in entry['amounts'].items()],
+            use_copy=use_copy,
+        )
+        insert_rows(
+            Recipe.tags.through,
+            ('recipe_id', 'tag_id'),
+            [(entry['recipe'].pk, pk)
+             for entry in entries for pk in entry['tags']],
+            use_copy=use_copy,
+        )
+        update_search_index_bulk(
+            Recipe.objects.filter(pk__in=[recipe.pk for recipe in recipes])
+        )
+        # bulk_create не отправляет сигналы, поэтому счетчики рецептов
+        # авторов и ленты подписчиков обновляются здесь.
+        authors = Counter(recipe.author_id for recipe in recipes)
+        for author_id, count in authors.items():
+            change_counter(Recipe, author_id, count)
+        fan_out_recipes(recipes)
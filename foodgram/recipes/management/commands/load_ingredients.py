@@ -1,30 +1,78 @@
 import csv
+import time
+from itertools import islice
+
 from django.conf import settings
 from django.core.management import BaseCommand, CommandError
+from django.db.transaction import atomic
 
+from recipes.bulk import copy_rows_ignore_conflicts, supports_copy
+from recipes.ingredient_index import ingredient_index
 from recipes.models import Ingredient
 
 
 class Command(BaseCommand):
     help = 'Загрузка из csv файла'
 
-    def handle(self, *args, **kwargs):
-        data_path = settings.BASE_DIR
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path', default=f'{settings.BASE_DIR}/data/ingredients.csv',
+            help='CSV файл со столбцами name, measurement_unit',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Число строк в одной транзакции',
+        )
+        parser.add_argument(
+            '--no-copy', action='store_true',
+            help='Не использовать COPY на PostgreSQL',
+        )
+
+    def handle(self, *args, **options):
+        use_copy = supports_copy() and not options['no_copy']
+        before = Ingredient.objects.count()
+        total = 0
+        started = time.monotonic()
         try:
-            with open(
-                f'{data_path}/data/ingredients.csv',
-                'r',
-                encoding='utf-8'
-            ) as file:
-                read_data = csv.reader(file)
-                bulk_list = list()
-                for items in read_data:
-                    name, measurement_unit = items
-                    bulk_list.append(
-                        Ingredient(name=name,
-                                   measurement_unit=measurement_unit)
-                    )
-                Ingredient.objects.bulk_create(bulk_list)
-            self.stdout.write(self.style.SUCCESS('Все ингридиенты загружены!'))
+            file = open(options['path'], 'r', encoding='utf-8')
         except FileNotFoundError:
             raise CommandError('Добавьте файл ingredients в директорию data')
+        with file:
+            rows = (
+                (name.strip(), measurement_unit.strip())
+                for name, measurement_unit in csv.reader(file)
+            )
+            while True:
+                # Повторы внутри пачки отбрасываются сразу, а уже
+                # загруженные строки пропускаются базой данных.
+                batch = set(islice(rows, options['batch_size']))
+                if not batch:
+                    break
+                with atomic():
+                    self.insert(batch, use_copy)
+                total += len(batch)
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f'Обработано строк: {total}, '
+                    f'{total / elapsed if elapsed else 0:.0f} строк/с'
+                )
+        created = Ingredient.objects.count() - before
+        if created:
+            ingredient_index.invalidate()
+        self.stdout.write(self.style.SUCCESS(
+            f'Все ингридиенты загружены! Новых: {created}, '
+            f'уже было: {total - created}.'
+        ))
+
+    def insert(self, batch, use_copy):
+        if use_copy:
+            copy_rows_ignore_conflicts(
+                Ingredient._meta.db_table, ('name', 'measurement_unit'),
+                batch,
+            )
+            return
+        Ingredient.objects.bulk_create(
+            (Ingredient(name=name, measurement_unit=measurement_unit)
+             for name, measurement_unit in batch),
+            ignore_conflicts=True,
+        )
@@ -1,6 +1,7 @@
 from django.core.management import BaseCommand
 
 from recipes.models import Tag
+from recipes.registry import tag_registry
 
 
 class Command(BaseCommand):
@@ -13,4 +14,5 @@ class Command(BaseCommand):
             {'name': 'Ужин', 'color': '#8775D2', 'slug': 'supper'}
         ]
         Tag.objects.bulk_create(Tag(**tag) for tag in data)
+        tag_registry.invalidate()
         self.stdout.write(self.style.SUCCESS('Все теги загружены!'))
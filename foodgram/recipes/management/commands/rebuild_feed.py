@@ -0,0 +1,16 @@
+from django.core.management import BaseCommand
+from django.db.transaction import atomic
+
+from recipes.feed import rebuild
+from recipes.models import FeedEntry
+
+
+class Command(BaseCommand):
+    help = 'Пересоздание лент подписок по текущим подпискам'
+
+    def handle(self, *args, **options):
+        with atomic():
+            rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Ленты подписок пересозданы: {FeedEntry.objects.count()} записей'
+        ))
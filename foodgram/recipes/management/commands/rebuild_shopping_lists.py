@@ -0,0 +1,66 @@
+from django.core.management import BaseCommand, CommandError
+from django.db.transaction import atomic
+
+from recipes.models import ShoppingListItem
+from recipes.shopping_list import computed_items
+
+
+class Command(BaseCommand):
+    help = 'Пересчет или проверка агрегированных списков покупок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только сравнить списки покупок с корзинами',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Размер пакета при вставке позиций',
+        )
+
+    def handle(self, *args, **options):
+        if options['check']:
+            return self.check_lists()
+        with atomic():
+            ShoppingListItem.objects.all().delete()
+            ShoppingListItem.objects.bulk_create(
+                (ShoppingListItem(**item)
+                 for item in computed_items().iterator()),
+                batch_size=options['batch_size'],
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Списки покупок пересчитаны: '
+            f'{ShoppingListItem.objects.count()} позиций'
+        ))
+
+    def check_lists(self):
+        expected = {
+            (item['user_id'], item['ingredient_id']): item['total']
+            for item in computed_items().iterator()
+        }
+        actual = {
+            (user_id, ingredient_id): total
+            for user_id, ingredient_id, total
+            in ShoppingListItem.objects.values_list(
+                'user_id', 'ingredient_id', 'total'
+            ).iterator()
+        }
+        drift = {
+            key for key in expected.keys() | actual.keys()
+            if expected.get(key) != actual.get(key)
+        }
+        for user_id, ingredient_id in sorted(drift):
+            self.stdout.write(
+                f'Пользователь {user_id}, ингредиент {ingredient_id}: '
+                f'ожидалось {expected.get((user_id, ingredient_id), 0)}, '
+                f'сохранено {actual.get((user_id, ingredient_id), 0)}'
+            )
+        if drift:
+            raise CommandError(
+                f'Расхождений в списках покупок: {len(drift)}. '
+                f'Запустите команду без --check для пересчета.'
+            )
+        self.stdout.write(self.style.SUCCESS('Списки покупок актуальны'))
@@ -0,0 +1,47 @@
+import time
+from itertools import islice
+
+from django.core.management import BaseCommand
+from django.db.transaction import atomic
+
+from recipes.models import SimilarRecipe
+from recipes.similarity import compute_all
+
+
+class Command(BaseCommand):
+    help = 'Пересчет похожих рецептов по совпадению ингредиентов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit',
+            type=int,
+            help='Число соседей для каждого рецепта '
+                 '(по умолчанию SIMILAR_RECIPES_COUNT)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Размер пакета при вставке',
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        rows = (
+            SimilarRecipe(recipe_id=recipe_id, similar_id=other_id,
+                          score=score)
+            for recipe_id, neighbours in compute_all(options['limit'])
+            for other_id, score in neighbours
+        )
+        with atomic():
+            SimilarRecipe.objects.all().delete()
+            while True:
+                batch = list(islice(rows, options['batch_size']))
+                if not batch:
+                    break
+                SimilarRecipe.objects.bulk_create(batch)
+        self.stdout.write(self.style.SUCCESS(
+            f'Похожие рецепты пересчитаны: '
+            f'{SimilarRecipe.objects.count()} пар '
+            f'за {time.monotonic() - started:.1f} с'
+        ))
@@ -0,0 +1,53 @@
+from django.core.management import BaseCommand, CommandError
+from django.db.transaction import atomic
+
+from recipes.counters import COUNTERS, drifted, reconcile
+
+
+class Command(BaseCommand):
+    help = 'Проверка и исправление счетчиков избранного, корзин, ' \
+           'рецептов и подписчиков'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только показать расхождения',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Число объектов, исправляемых одним запросом',
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        for related, (model, field, _) in COUNTERS.items():
+            rows = drifted(related).values_list('pk', field, 'actual')
+            batch = []
+            for pk, stored, actual in rows.iterator():
+                self.stdout.write(
+                    f'{model._meta.verbose_name} {pk}: {field} = {stored}, '
+                    f'ожидалось {actual}'
+                )
+                batch.append(pk)
+                total += 1
+                if len(batch) >= options['batch_size']:
+                    self.fix(related, batch, options)
+                    batch = []
+            self.fix(related, batch, options)
+        if options['check'] and total:
+            raise CommandError(
+                f'Расхождений в счетчиках: {total}. '
+                f'Запустите команду без --check для исправления.'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено счетчиков: {total}' if total
+            else 'Счетчики актуальны'
+        ))
+
+    def fix(self, related, pks, options):
+        if pks and not options['check']:
+            with atomic():
+                reconcile(related, pks)
@@ -1,8 +1,15 @@
 from django.conf import settings
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.db import models
+from django.db.models import (BooleanField, Exists, F, OuterRef, Prefetch,
+                              Q, Value, Window)
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
+from django.utils import timezone
 
-from users.models import User
+from users.models import Follow, User
+from .search import search_recipes
 
 
 class Ingredient(models.Model):
@@ -59,6 +66,87 @@ class Tag(models.Model):
         return self.name
 
 
+class RecipeQuerySet(models.QuerySet):
+    """Набор запросов рецептов, подготовленный для чтения через API"""
+
+    def with_user_flags(self, user):
+        """Аннотирует флаги избранного и корзины текущего пользователя"""
+        if user.is_anonymous:
+            return self.annotate(
+                is_favorited=Value(False, output_field=BooleanField()),
+                is_in_shopping_cart=Value(False, output_field=BooleanField()),
+            )
+        return self.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+        )
+
+    def for_read(self, user):
+        """Загружает связанные объекты за постоянное число запросов"""
+        return self.with_user_flags(user).prefetch_related(
+            Prefetch(
+                'author',
+                queryset=User.objects.with_is_subscribed(user),
+            ),
+            'tags',
+            Prefetch(
+                'ingredient_in_recipe',
+                queryset=RecipeIngredient.objects.select_related(
+                    'ingredient'
+                ),
+            ),
+        )
+
+    def latest_for_authors(self, authors, limit=None):
+        """Последние рецепты авторов, не больше limit на каждого.
+
+        Отбор выполняется одним запросом с оконной функцией
+        ROW_NUMBER() OVER (PARTITION BY author_id).
+        """
+        queryset = self.filter(author__in=authors)
+        if limit is None:
+            return queryset
+        ranked = queryset.annotate(recipe_rank=Window(
+            expression=RowNumber(),
+            partition_by=[F('author')],
+            order_by=F('pk').desc(),
+        )).values('pk', 'recipe_rank')
+        sql, params = ranked.query.sql_with_params()
+        return queryset.filter(pk__in=RawSQL(
+            f'SELECT id FROM ({sql}) AS ranked WHERE recipe_rank <= %s',
+            (*params, limit),
+        ))
+
+    def touch(self):
+        """Отмечает рецепты измененными после правки связанных данных"""
+        return self.update(updated_at=timezone.now())
+
+    def search(self, query):
+        """Полнотекстовый поиск по названию и описанию рецепта"""
+        return search_recipes(self, query)
+
+    def feed(self, user):
+        """Рецепты авторов, на которых подписан пользователь.
+
+        Рецепты большинства авторов берутся из готовой ленты FeedEntry,
+        а рецепты авторов, у которых подписчиков больше
+        FEED_FANOUT_MAX_FOLLOWERS, выбираются по подпискам при чтении.
+        """
+        return self.filter(
+            Q(pk__in=FeedEntry.objects.filter(user=user).values('recipe'))
+            | Q(author__in=Follow.objects.filter(
+                user=user,
+                following__followers_count__gt=(
+                    settings.FEED_FANOUT_MAX_FOLLOWERS
+                ),
+            ).values('following'))
+        )
+
+
 class Recipe(models.Model):
     """Модель рецепта"""
     name = models.CharField(
@@ -75,6 +163,12 @@ class Recipe(models.Model):
         'Фото рецепта',
         upload_to='recipe_pics/',
     )
+    image_variants = models.JSONField(
+        'Уменьшенные копии фото',
+        default=dict,
+        blank=True,
+        editable=False,
+    )
     ingredients = models.ManyToManyField(
         Ingredient,
         through='RecipeIngredient',
@@ -105,8 +199,33 @@ class Recipe(models.Model):
             )
         ],
     )
+    updated_at = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True,
+        db_index=True,
+    )
+    search_vector = SearchVectorField(
+        'Поисковый вектор',
+        null=True,
+        editable=False,
+    )
+    favorites_count = models.PositiveIntegerField(
+        'В избранном',
+        default=0,
+        editable=False,
+    )
+    in_carts_count = models.PositiveIntegerField(
+        'В корзинах',
+        default=0,
+        editable=False,
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
+        indexes = [
+            models.Index(fields=('author', '-id'), name='recipe_author_idx'),
+        ]
         ordering = ('-pk',)
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
@@ -203,3 +322,112 @@ class ShoppingCart(FavoriteShoppingCart):
         ordering = ('-recipe',)
         verbose_name = 'Покупки'
         verbose_name_plural = 'Покупки'
+
+
+class ShoppingListItem(models.Model):
+    """Агрегированное количество ингредиента в списке покупок пользователя.
+
+    Поддерживается в актуальном состоянии при изменении корзины и состава
+    рецептов, чтобы выгрузка списка покупок не пересчитывала сумму.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_items',
+        verbose_name='Ингредиент',
+    )
+    total = models.PositiveIntegerField(
+        'Общее количество',
+    )
+
+    class Meta:
+        constraints = [models.UniqueConstraint(
+            fields=['user', 'ingredient'],
+            name='unique_shopping_list_item')
+        ]
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Позиции списка покупок'
+
+    def __str__(self):
+        return (f'{self.user.username}: {self.ingredient.name} '
+                f'{self.total} {self.ingredient.measurement_unit}')
+
+
+class FeedEntry(models.Model):
+    """Запись ленты подписок: рецепт автора, на которого подписан
+    пользователь. Добавляется при публикации рецепта и при подписке."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed',
+        verbose_name='Подписчик',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Рецепт',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор рецепта',
+    )
+
+    class Meta:
+        constraints = [models.UniqueConstraint(
+            fields=['user', 'recipe'],
+            name='unique_feed_entry')
+        ]
+        indexes = [
+            models.Index(
+                fields=('user', 'author'), name='feed_user_author_idx'
+            ),
+        ]
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Лента подписок'
+
+    def __str__(self):
+        return f'{self.user.username}: {self.recipe.name}'
+
+
+class SimilarRecipe(models.Model):
+    """Рецепт, похожий на данный по составу ингредиентов"""
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar_recipes',
+        verbose_name='Рецепт',
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar_to',
+        verbose_name='Похожий рецепт',
+    )
+    score = models.FloatField(
+        'Сходство',
+    )
+
+    class Meta:
+        constraints = [models.UniqueConstraint(
+            fields=['recipe', 'similar'],
+            name='unique_similar_recipe')
+        ]
+        indexes = [
+            models.Index(
+                fields=('recipe', '-score'), name='similar_recipe_score_idx'
+            ),
+        ]
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+
+    def __str__(self):
+        return f'{self.recipe.name} ~ {self.similar.name}: {self.score:.2f}'
@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connection
+from django.utils.functional import cached_property
+
+
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор админки, не считающий большие таблицы целиком.
+
+    Для списка без фильтров на PostgreSQL берется оценка числа строк
+    из pg_class; точный COUNT(*) выполняется, только если таблица меньше
+    ADMIN_ESTIMATED_COUNT_THRESHOLD или в списке применены фильтры.
+    """
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if (connection.vendor == 'postgresql' and query is not None
+                and not query.where):
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples FROM pg_class WHERE relname = %s',
+                    [self.object_list.model._meta.db_table],
+                )
+                row = cursor.fetchone()
+            if row and row[0] >= settings.ADMIN_ESTIMATED_COUNT_THRESHOLD:
+                return int(row[0])
+        return super().count
@@ -0,0 +1,231 @@
+"""Поиск рецептов по продуктам, которые есть у пользователя.
+
+В памяти процесса хранится инвертированный индекс: для каждого
+ингредиента и каждого тега - битовая маска рецептов (целое число, где
+бит i соответствует i-му рецепту). Кандидаты - это объединение масок
+имеющихся продуктов, пересеченное с маской тегов; для них число
+недостающих ингредиентов считается по составу рецепта в памяти.
+
+Индекс строится целиком один раз, а затем обновляется по рецептам:
+сигналы записывают в общий кэш журнал измененных рецептов (номер
+записи - счетчик внутри метки версии PANTRY_VERSION_KEY), и каждый
+процесс перечитывает из базы только рецепты из новых записей журнала.
+Счетчик начинается с текущего времени в наносекундах, поэтому после
+вытеснения из кэша он не повторит прежних значений. Если записи журнала
+пропали или их слишком много, индекс строится заново.
+"""
+from time import time_ns
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Recipe, RecipeIngredient
+from .registry import VersionedRegistry
+from .replicas import use_primary
+from .versions import PANTRY_VERSION_KEY, bump_version, get_version
+
+# Больше изменений за раз применять дороже, чем построить индекс заново
+MAX_APPLIED_CHANGES = 1000
+
+
+def _positions(bits):
+    while bits:
+        lowest = bits & -bits
+        yield lowest.bit_length() - 1
+        bits ^= lowest
+
+
+def _group(ingredient_rows, tag_rows):
+    recipes = {}
+    for recipe_id, ingredient_id in ingredient_rows:
+        recipes.setdefault(recipe_id, set()).add(ingredient_id)
+    tags = {}
+    for recipe_id, slug in tag_rows:
+        tags.setdefault(recipe_id, set()).add(slug)
+    return recipes, tags
+
+
+class _Snapshot:
+    """Маски рецептов. Позиция рецепта не меняется; у удаленного рецепта
+    позиция остается пустой"""
+
+    def __init__(self, version, sequence, recipes, tags):
+        self.version = version
+        self.sequence = sequence
+        self.recipe_ids = sorted(recipes)
+        self.position_of = {
+            pk: position for position, pk in enumerate(self.recipe_ids)
+        }
+        self.ingredients = [recipes[pk] for pk in self.recipe_ids]
+        self.tags = [tags.get(pk, set()) for pk in self.recipe_ids]
+        self.ingredient_bits = {}
+        self.tag_bits = {}
+        for position in range(len(self.recipe_ids)):
+            self._set_bits(position)
+
+    def _set_bits(self, position, enabled=True):
+        bit = 1 << position
+        for bits, keys in ((self.ingredient_bits, self.ingredients),
+                           (self.tag_bits, self.tags)):
+            for key in keys[position]:
+                value = bits.get(key, 0)
+                bits[key] = value | bit if enabled else value & ~bit
+
+    def updated(self, sequence, recipe_ids, recipes, tags):
+        """Новый снимок, в котором рецепты recipe_ids перечитаны из
+        recipes и tags; текущий снимок не меняется"""
+        snapshot = object.__new__(_Snapshot)
+        snapshot.version = self.version
+        snapshot.sequence = sequence
+        snapshot.recipe_ids = list(self.recipe_ids)
+        snapshot.position_of = dict(self.position_of)
+        snapshot.ingredients = list(self.ingredients)
+        snapshot.tags = list(self.tags)
+        snapshot.ingredient_bits = dict(self.ingredient_bits)
+        snapshot.tag_bits = dict(self.tag_bits)
+        for pk in recipe_ids:
+            position = snapshot.position_of.get(pk)
+            if position is not None:
+                snapshot._set_bits(position, enabled=False)
+            elif pk in recipes:
+                position = len(snapshot.recipe_ids)
+                snapshot.position_of[pk] = position
+                snapshot.recipe_ids.append(pk)
+                snapshot.ingredients.append(set())
+                snapshot.tags.append(set())
+            else:
+                continue
+            snapshot.ingredients[position] = recipes.get(pk, set())
+            snapshot.tags[position] = (
+                tags.get(pk, set()) if pk in recipes else set()
+            )
+            snapshot._set_bits(position)
+        return snapshot
+
+
+def _sequence_key(version):
+    return f'{PANTRY_VERSION_KEY}:{version}:sequence'
+
+
+def _change_key(version, sequence):
+    return f'{PANTRY_VERSION_KEY}:{version}:change:{sequence}'
+
+
+def _current_sequence(version):
+    key = _sequence_key(version)
+    sequence = cache.get(key)
+    if sequence is None:
+        cache.add(key, time_ns(), timeout=None)
+        sequence = cache.get(key, 0)
+    return sequence
+
+
+class PantryIndex(VersionedRegistry):
+    """Инвертированный индекс ингредиент -> рецепты"""
+    model = Recipe
+    version_key = PANTRY_VERSION_KEY
+
+    def build(self, version, sequence=0):
+        return _Snapshot(version, sequence, *_group(
+            RecipeIngredient.objects.values_list(
+                'recipe_id', 'ingredient_id'
+            ).order_by().iterator(),
+            Recipe.tags.through.objects.values_list(
+                'recipe_id', 'tag__slug'
+            ).order_by().iterator(),
+        ))
+
+    def apply_changes(self, snapshot, sequence):
+        """Снимок с изменениями из журнала или None, если журнал неполон"""
+        keys = [_change_key(snapshot.version, number)
+                for number in range(snapshot.sequence + 1, sequence + 1)]
+        changes = cache.get_many(keys)
+        if len(changes) != len(keys):
+            return None
+        recipe_ids = set().union(*changes.values())
+        return snapshot.updated(sequence, recipe_ids, *_group(
+            RecipeIngredient.objects.filter(
+                recipe_id__in=recipe_ids
+            ).values_list('recipe_id', 'ingredient_id').order_by(),
+            Recipe.tags.through.objects.filter(
+                recipe_id__in=recipe_ids
+            ).values_list('recipe_id', 'tag__slug').order_by(),
+        ))
+
+    def get_snapshot(self):
+        version = get_version(self.version_key)
+        sequence = _current_sequence(version)
+        snapshot = self._snapshot
+        if (snapshot is not None and snapshot.version == version
+                and snapshot.sequence == sequence):
+            return snapshot
+        with self._lock:
+            snapshot = self._snapshot
+            if (snapshot is not None and snapshot.version == version
+                    and snapshot.sequence == sequence):
+                return snapshot
+            with use_primary():
+                if (snapshot is not None and snapshot.version == version
+                        and 0 < sequence - snapshot.sequence
+                        <= MAX_APPLIED_CHANGES):
+                    snapshot = self.apply_changes(snapshot, sequence)
+                else:
+                    snapshot = None
+                if snapshot is None:
+                    snapshot = self.build(version, sequence)
+            self._snapshot = snapshot
+        return snapshot
+
+    def recipes_changed(self, recipe_ids):
+        """Записывает в журнал рецепты, которые нужно перечитать, после
+        фиксации транзакции"""
+        recipe_ids = set(recipe_ids)
+
+        def record():
+            version = get_version(self.version_key)
+            _current_sequence(version)
+            try:
+                sequence = cache.incr(_sequence_key(version))
+            except ValueError:
+                # Счетчик вытеснен из кэша: все процессы строят индекс
+                # заново
+                bump_version(self.version_key)
+                return
+            cache.set(
+                _change_key(version, sequence), recipe_ids, timeout=None
+            )
+
+        if recipe_ids:
+            transaction.on_commit(record)
+
+    def search(self, ingredient_ids, missing=0, tags=None):
+        """Рецепты, для которых не хватает не больше missing ингредиентов.
+
+        Возвращает первичные ключи: сначала рецепты с наибольшим числом
+        имеющихся ингредиентов, затем с наименьшим числом недостающих,
+        затем более новые.
+        """
+        snapshot = self.get_snapshot()
+        pantry = set(ingredient_ids)
+        candidates = 0
+        for ingredient_id in pantry:
+            candidates |= snapshot.ingredient_bits.get(ingredient_id, 0)
+        if tags:
+            tag_mask = 0
+            for slug in tags:
+                tag_mask |= snapshot.tag_bits.get(slug, 0)
+            candidates &= tag_mask
+        ranked = []
+        for position in _positions(candidates):
+            needed = snapshot.ingredients[position]
+            have = len(needed & pantry)
+            lacking = len(needed) - have
+            if lacking <= missing:
+                ranked.append(
+                    (-have, lacking, -snapshot.recipe_ids[position])
+                )
+        ranked.sort()
+        return [-pk for _, _, pk in ranked]
+
+
+pantry_index = PantryIndex()
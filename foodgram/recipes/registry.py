@@ -0,0 +1,92 @@
+"""Справочники в памяти процесса.
+
+Теги и ингредиенты меняются редко, поэтому списки, проверка слагов и
+идентификаторов обслуживаются из копии в памяти. Копия перестраивается,
+когда меняется метка версии в общем кэше (см. recipes.versions).
+"""
+from threading import Lock
+
+from django.db import router
+
+from .models import Tag
+from .replicas import use_primary
+from .versions import TAGS_VERSION_KEY, bump_version_on_commit, get_version
+
+
+class VersionedRegistry:
+    """Базовый справочник: хранит снимок данных и метку его версии.
+
+    Наследник определяет build(version), который читает данные из базы и
+    возвращает снимок с атрибутом version (и by_pk и items, если
+    используются get_item() и all()).
+    """
+    model = None
+    version_key = None
+
+    def __init__(self):
+        self._snapshot = None
+        self._lock = Lock()
+
+    def get_item(self, pk):
+        """Запись справочника в виде словаря или None"""
+        try:
+            pk = int(pk)
+        except (TypeError, ValueError):
+            return None
+        return self.get_snapshot().by_pk.get(pk)
+
+    def get(self, pk):
+        """Объект модели, восстановленный из справочника, или None"""
+        item = self.get_item(pk)
+        if item is None:
+            return None
+        return self.model.from_db(
+            router.db_for_read(self.model), list(item), list(item.values())
+        )
+
+    def all(self):
+        return self.get_snapshot().items
+
+    def invalidate(self):
+        """Сообщает всем процессам, что данные изменились"""
+        self._snapshot = None
+        bump_version_on_commit(self.version_key)
+
+    def get_snapshot(self):
+        version = get_version(self.version_key)
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == version:
+            return snapshot
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None or snapshot.version != version:
+                with use_primary():
+                    snapshot = self.build(version)
+                self._snapshot = snapshot
+        return snapshot
+
+
+class _TagSnapshot:
+
+    def __init__(self, version, rows):
+        self.version = version
+        self.items = list(rows)
+        self.by_pk = {item['id']: item for item in self.items}
+        self.by_slug = {item['slug']: item for item in self.items}
+
+
+class TagRegistry(VersionedRegistry):
+    """Теги в порядке сортировки модели"""
+    model = Tag
+    version_key = TAGS_VERSION_KEY
+
+    def build(self, version):
+        return _TagSnapshot(
+            version, Tag.objects.values('id', 'name', 'color', 'slug')
+        )
+
+    def slugs(self):
+        return self.get_snapshot().by_slug.keys()
+
+
+tag_registry = TagRegistry()
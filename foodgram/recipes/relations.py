@@ -0,0 +1,176 @@
+"""Добавление и удаление избранного, корзины и подписок.
+
+Вставка и удаление выполняются одним запросом без сигналов, поэтому их
+последствия (счетчики, список покупок, лента, версия состояния
+пользователя) применяются явно, тоже по одному запросу на каждое.
+"""
+from django.db import IntegrityError, connection, transaction
+
+from users.models import Follow, User
+from . import counters, feed, shopping_list
+from .models import Favorite, Recipe, ShoppingCart
+from .versions import bump_version_on_commit, user_state_version_key
+
+# Модель связи: (модель объектов, поле связи)
+RELATIONS = {
+    Favorite: (Recipe, 'recipe'),
+    ShoppingCart: (Recipe, 'recipe'),
+    Follow: (User, 'following'),
+}
+
+
+def _lock_user(user):
+    """Операции одного пользователя выполняются по очереди, чтобы
+    проверка существующих связей не устарела до вставки"""
+    list(User.objects.select_for_update().filter(
+        pk=user.pk
+    ).values_list('pk', flat=True))
+
+
+def _after_add(model, user, ids):
+    if model is ShoppingCart:
+        shopping_list.add_recipes(user.pk, ids)
+    elif model is Follow:
+        feed.backfill_authors(user.pk, ids)
+
+
+def _after_remove(model, user, ids):
+    if model is ShoppingCart:
+        shopping_list.remove_recipes(user.pk, ids)
+    elif model is Follow:
+        feed.prune_authors(user.pk, ids)
+
+
+def add_relations(model, user, ids):
+    """Связывает пользователя с объектами ids.
+
+    Возвращает словарь со списками added, existing и missing (объекта
+    нет или связь с ним недопустима). Должна вызываться в транзакции.
+    """
+    target, field = RELATIONS[model]
+    ids = list(dict.fromkeys(ids))
+    _lock_user(user)
+    found = target.objects.filter(pk__in=ids)
+    if model is Follow:
+        found = found.exclude(pk=user.pk)
+    found = set(found.values_list('pk', flat=True))
+    existing = set(model.objects.filter(
+        user=user, **{f'{field}__in': found}
+    ).values_list(f'{field}_id', flat=True))
+    added = [pk for pk in ids if pk in found and pk not in existing]
+    if added:
+        model.objects.bulk_create(
+            (model(user=user, **{f'{field}_id': pk}) for pk in added),
+            ignore_conflicts=True,
+        )
+        counters.change_counters(model, added, 1)
+        _after_add(model, user, added)
+        bump_version_on_commit(user_state_version_key(user.pk))
+    return {
+        'added': added,
+        'existing': [pk for pk in ids if pk in existing],
+        'missing': [pk for pk in ids if pk not in found],
+    }
+
+
+def remove_relations(model, user, ids):
+    """Удаляет связи пользователя с объектами ids одним DELETE ... IN.
+
+    Возвращает словарь со списками removed и missing (связи не было).
+    Должна вызываться в транзакции.
+    """
+    _, field = RELATIONS[model]
+    ids = list(dict.fromkeys(ids))
+    _lock_user(user)
+    relations = model.objects.filter(user=user, **{f'{field}__in': ids})
+    present = set(relations.values_list(f'{field}_id', flat=True))
+    if present:
+        # _raw_delete удаляет строки без выборки объектов и сигналов.
+        relations._raw_delete(relations.db)
+        counters.change_counters(model, present, -1)
+        _after_remove(model, user, present)
+        bump_version_on_commit(user_state_version_key(user.pk))
+    return {
+        'removed': [pk for pk in ids if pk in present],
+        'missing': [pk for pk in ids if pk not in present],
+    }
+
+
+def _columns(model):
+    target, field = RELATIONS[model]
+    quote = connection.ops.quote_name
+    return (
+        quote(model._meta.db_table),
+        quote(model._meta.get_field(field).column),
+        quote(target._meta.db_table),
+    )
+
+
+def _insert_returning(model, user, pk):
+    """INSERT ... SELECT ... ON CONFLICT DO NOTHING RETURNING: строка
+    вставляется, только если объект есть, а связи еще нет"""
+    table, column, target_table = _columns(model)
+    if connection.vendor not in ('postgresql', 'sqlite'):
+        target, field = RELATIONS[model]
+        try:
+            with transaction.atomic():
+                model.objects.bulk_create(
+                    [model(user=user, **{f'{field}_id': pk})]
+                )
+        except IntegrityError:
+            return False
+        return True
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} (user_id, {column}) '
+            f'SELECT %s, id FROM {target_table} WHERE id = %s '
+            f'ON CONFLICT DO NOTHING RETURNING id',
+            [user.pk, pk],
+        )
+        return cursor.fetchone() is not None
+
+
+def _delete_returning(model, user, pk):
+    table, column, _ = _columns(model)
+    if connection.vendor not in ('postgresql', 'sqlite'):
+        _, field = RELATIONS[model]
+        return model.objects.filter(
+            user=user, **{field: pk}
+        )._raw_delete(connection.alias) > 0
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {table} WHERE user_id = %s AND {column} = %s '
+            f'RETURNING id',
+            [user.pk, pk],
+        )
+        return cursor.fetchone() is not None
+
+
+def add_relation(model, user, pk):
+    """Связывает пользователя с объектом pk одним запросом.
+
+    Возвращает True, если связь добавлена, False, если она уже была,
+    и None, если объекта нет. Должна вызываться в транзакции.
+    """
+    if not _insert_returning(model, user, pk):
+        target, _ = RELATIONS[model]
+        return False if target.objects.filter(pk=pk).exists() else None
+    counters.change_counters(model, [pk], 1)
+    _after_add(model, user, [pk])
+    bump_version_on_commit(user_state_version_key(user.pk))
+    return True
+
+
+def remove_relation(model, user, pk):
+    """Удаляет связь пользователя с объектом pk одним запросом.
+
+    Возвращает True, если связь удалена, False, если ее не было,
+    и None, если объекта нет. Должна вызываться в транзакции.
+    """
+    if not _delete_returning(model, user, pk):
+        target, _ = RELATIONS[model]
+        return False if target.objects.filter(pk=pk).exists() else None
+    counters.change_counters(model, [pk], -1)
+    _after_remove(model, user, [pk])
+    bump_version_on_commit(user_state_version_key(user.pk))
+    return True
@@ -0,0 +1,116 @@
+"""Чтение с реплик базы данных.
+
+Роутер отправляет все записи в основную базу, а чтение - в реплику,
+только если она выбрана для текущего потока (это делает
+api.replicas.ReplicaReadMixin для безопасных запросов). Реплики
+выбираются по кругу; недоступная реплика исключается из пула на
+REPLICA_EJECT_SECONDS. После записи запросы пользователя читают с
+основной базы REPLICA_STICKY_SECONDS, чтобы он видел свои изменения.
+"""
+from contextlib import contextmanager
+from itertools import count
+from threading import Lock, local
+from time import monotonic, time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+_state = local()
+
+
+def current_alias():
+    return getattr(_state, 'alias', DEFAULT_DB_ALIAS)
+
+
+def set_alias(alias):
+    _state.alias = alias
+
+
+@contextmanager
+def use_primary():
+    """Чтение с основной базы, например для построения снимков в памяти"""
+    previous = current_alias()
+    set_alias(DEFAULT_DB_ALIAS)
+    try:
+        yield
+    finally:
+        set_alias(previous)
+
+
+def may_be_stale(modified):
+    """Реплика могла еще не получить изменение, сделанное в modified"""
+    return (current_alias() != DEFAULT_DB_ALIAS and modified is not None
+            and time() - modified < settings.REPLICA_STICKY_SECONDS)
+
+
+def _pin_key(user_id):
+    return f'db:primary:{user_id}'
+
+
+def pin_to_primary(user_id):
+    cache.set(
+        _pin_key(user_id), True, timeout=settings.REPLICA_STICKY_SECONDS
+    )
+
+
+def is_pinned(user_id):
+    return cache.get(_pin_key(user_id), False)
+
+
+class ReplicaPool:
+    """Выбор реплики по кругу с исключением недоступных"""
+
+    def __init__(self):
+        self._counter = count()
+        self._ejected = {}
+        self._lock = Lock()
+
+    def is_healthy(self, alias):
+        connection = connections[alias]
+        try:
+            if (connection.connection is not None
+                    and not connection.is_usable()):
+                connection.close()
+            connection.ensure_connection()
+        except DatabaseError:
+            return False
+        return True
+
+    def eject(self, alias):
+        with self._lock:
+            self._ejected[alias] = monotonic() + settings.REPLICA_EJECT_SECONDS
+
+    def choose(self):
+        """Имя доступной реплики или основной базы, если таких нет"""
+        aliases = settings.REPLICA_DATABASES
+        for _ in range(len(aliases)):
+            alias = aliases[next(self._counter) % len(aliases)]
+            if self._ejected.get(alias, 0) > monotonic():
+                continue
+            if self.is_healthy(alias):
+                return alias
+            self.eject(alias)
+        return DEFAULT_DB_ALIAS
+
+
+replica_pool = ReplicaPool()
+
+
+class PrimaryReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        alias = current_alias()
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            # Внутри транзакции читаем то, что в ней записано
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
@@ -0,0 +1,112 @@
+"""Полнотекстовый поиск рецептов.
+
+На PostgreSQL используется хранимый tsvector с GIN-индексом (русская
+конфигурация) и триграммное сходство по названию, на SQLite - виртуальная
+таблица FTS5. Индекс обновляется сигналами при сохранении и удалении
+рецепта, а при массовой загрузке - update_search_index_bulk.
+"""
+import re
+
+from django.conf import settings
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector, TrigramSimilarity)
+from django.db import connection
+from django.db.models import F, Q
+from django.db.models.expressions import RawSQL
+
+SEARCH_CONFIG = 'russian'
+FTS_TABLE = 'recipes_recipe_fts'
+
+SEARCH_VECTOR = (
+    SearchVector('name', weight='A', config=SEARCH_CONFIG)
+    + SearchVector('text', weight='B', config=SEARCH_CONFIG)
+)
+
+
+def _fts_query(query):
+    """Превращает ввод пользователя в безопасный запрос FTS5"""
+    return ' '.join(f'"{word}"*' for word in re.findall(r'\w+', query))
+
+
+def update_search_index(recipe):
+    """Пересчитывает поисковый индекс для рецепта"""
+    if connection.vendor == 'postgresql':
+        type(recipe).objects.filter(pk=recipe.pk).update(
+            search_vector=SEARCH_VECTOR
+        )
+    elif connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [recipe.pk]
+            )
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, text) '
+                f'VALUES (%s, %s, %s)',
+                [recipe.pk, recipe.name, recipe.text],
+            )
+
+
+def update_search_index_bulk(queryset):
+    """Пересчитывает поисковый индекс для набора рецептов"""
+    if connection.vendor == 'postgresql':
+        queryset.update(search_vector=SEARCH_VECTOR)
+    elif connection.vendor == 'sqlite':
+        recipe_ids = list(queryset.values_list('pk', flat=True))
+        if not recipe_ids:
+            return
+        placeholders = ', '.join(['%s'] * len(recipe_ids))
+        table = queryset.model._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})',
+                recipe_ids,
+            )
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, text) '
+                f'SELECT id, name, text FROM {table} '
+                f'WHERE id IN ({placeholders})',
+                recipe_ids,
+            )
+
+
+def remove_from_search_index(recipe_id):
+    """Удаляет рецепт из таблицы FTS5 (tsvector удаляется вместе с ним)"""
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [recipe_id]
+            )
+
+
+def search_recipes(queryset, query):
+    """Отбирает рецепты по запросу и сортирует их по релевантности"""
+    if connection.vendor == 'postgresql':
+        search_query = SearchQuery(
+            query, config=SEARCH_CONFIG, search_type='websearch'
+        )
+        return queryset.annotate(
+            search_rank=(
+                SearchRank(F('search_vector'), search_query)
+                + TrigramSimilarity('name', query)
+            ),
+            name_similarity=TrigramSimilarity('name', query),
+        ).filter(
+            Q(search_vector=search_query)
+            | Q(name_similarity__gte=settings.TRIGRAM_SIMILARITY_THRESHOLD)
+        ).order_by('-search_rank', '-pk')
+    if connection.vendor == 'sqlite':
+        fts_query = _fts_query(query)
+        if not fts_query:
+            return queryset.none()
+        table = queryset.model._meta.db_table
+        return queryset.filter(pk__in=RawSQL(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+            (fts_query,),
+        )).annotate(search_rank=RawSQL(
+            f'SELECT -bm25({FTS_TABLE}, 10.0, 1.0) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND rowid = {table}.id',
+            (fts_query,),
+        )).order_by('-search_rank', '-pk')
+    return queryset.filter(
+        Q(name__icontains=query) | Q(text__icontains=query)
+    )
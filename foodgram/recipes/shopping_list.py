@@ -0,0 +1,118 @@
+"""Поддержка агрегированного списка покупок ShoppingListItem.
+
+Каждое изменение корзины или состава рецепта превращается в набор
+приращений количества ингредиентов, которые применяются к позициям
+списка покупок затронутых пользователей в той же транзакции.
+"""
+from collections import Counter, defaultdict
+
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from django.db.models.functions import Greatest
+
+from users.models import User
+from .models import RecipeIngredient, ShoppingCart, ShoppingListItem
+
+
+def recipe_amounts(recipe_id):
+    """Количество каждого ингредиента в рецепте"""
+    return Counter(dict(RecipeIngredient.objects.filter(
+        recipe_id=recipe_id
+    ).values_list('ingredient_id', 'amount')))
+
+
+def apply_deltas(user_ids, deltas):
+    """Прибавляет deltas {ingredient_id: количество} к спискам покупок.
+
+    Должна вызываться внутри транзакции: строки пользователей блокируются,
+    чтобы параллельные изменения одной корзины выполнялись по очереди.
+    """
+    deltas = {pk: delta for pk, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    user_ids = sorted(set(user_ids))
+    if not user_ids:
+        return
+    list(User.objects.select_for_update().filter(
+        pk__in=user_ids
+    ).order_by('pk').values_list('pk', flat=True))
+    items = ShoppingListItem.objects.filter(
+        user_id__in=user_ids, ingredient_id__in=deltas
+    )
+    existing = set(items.values_list('user_id', 'ingredient_id'))
+    if existing:
+        items.update(total=Greatest(F('total') + Case(
+            *(When(ingredient_id=pk, then=Value(delta))
+              for pk, delta in deltas.items()),
+            output_field=IntegerField(),
+        ), Value(0)))
+    ShoppingListItem.objects.bulk_create(
+        ShoppingListItem(user_id=user_id, ingredient_id=pk, total=delta)
+        for user_id in user_ids
+        for pk, delta in deltas.items()
+        if delta > 0 and (user_id, pk) not in existing
+    )
+    items.filter(total__lte=0).delete()
+
+
+def recipes_amounts(recipe_ids):
+    """Суммарное количество каждого ингредиента в нескольких рецептах"""
+    return Counter(dict(RecipeIngredient.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values('ingredient_id').annotate(
+        total=Sum('amount')
+    ).order_by().values_list('ingredient_id', 'total')))
+
+
+def add_recipes(user_id, recipe_ids):
+    apply_deltas([user_id], recipes_amounts(recipe_ids))
+
+
+def remove_recipes(user_id, recipe_ids):
+    apply_deltas([user_id], {
+        pk: -amount for pk, amount in recipes_amounts(recipe_ids).items()
+    })
+
+
+def add_recipe(user_id, recipe_id):
+    apply_deltas([user_id], recipe_amounts(recipe_id))
+
+
+def remove_recipe(user_id, recipe_id):
+    apply_deltas([user_id], {
+        pk: -amount for pk, amount in recipe_amounts(recipe_id).items()
+    })
+
+
+def change_recipe(recipe_id, old_amounts, new_amounts):
+    """Переносит изменение состава рецепта в списки покупок"""
+    deltas = Counter(new_amounts)
+    deltas.subtract(old_amounts)
+    apply_deltas(
+        ShoppingCart.objects.filter(
+            recipe_id=recipe_id
+        ).values_list('user_id', flat=True),
+        deltas,
+    )
+
+
+def change_row(old, new):
+    """Переносит изменение одной строки RecipeIngredient в списки
+    покупок. old и new - (recipe_id, ingredient_id, amount) или None"""
+    changes = defaultdict(lambda: (Counter(), Counter()))
+    if old is not None:
+        recipe_id, ingredient_id, amount = old
+        changes[recipe_id][0][ingredient_id] += amount
+    if new is not None:
+        recipe_id, ingredient_id, amount = new
+        changes[recipe_id][1][ingredient_id] += amount
+    for recipe_id, amounts in changes.items():
+        change_recipe(recipe_id, *amounts)
+
+
+def computed_items():
+    """Позиции списков покупок, посчитанные заново по корзинам"""
+    return RecipeIngredient.objects.filter(
+        recipe__shopping_cart__isnull=False
+    ).values(
+        'ingredient_id', user_id=F('recipe__shopping_cart__user')
+    ).annotate(total=Sum('amount')).order_by()
@@ -0,0 +1,219 @@
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+
+from users.models import Follow, User
+
+from . import counters, feed, shopping_list
+from .ingredient_index import ingredient_index
+from .pantry import pantry_index
+from .registry import tag_registry
+from .models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                     ShoppingCart, Tag)
+from .search import remove_from_search_index, update_search_index
+from .versions import (RECIPE_DATA_VERSION_KEY, bump_version_on_commit,
+                       user_state_version_key)
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredient_index(**kwargs):
+    """Сбрасывает индекс ингредиентов при изменении каталога"""
+    ingredient_index.invalidate()
+
+
+@receiver(post_save, sender=Recipe)
+def add_recipe_to_search_index(instance, update_fields, **kwargs):
+    """Индексирует рецепт при любом сохранении: через API, админку или
+    ORM"""
+    if update_fields is None or {'name', 'text'} & set(update_fields):
+        update_search_index(instance)
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_recipe_from_search_index(instance, **kwargs):
+    """Удаляет рецепт из поискового индекса"""
+    remove_from_search_index(instance.pk)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_to_shopping_list(instance, created, **kwargs):
+    """Добавляет ингредиенты рецепта в список покупок"""
+    if created:
+        shopping_list.add_recipe(instance.user_id, instance.recipe_id)
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def remove_from_shopping_list(instance, **kwargs):
+    """Вычитает ингредиенты рецепта из списка покупок.
+
+    Вызывается после удаления, как и remove_recipe_ingredient: при
+    каскадном удалении рецепта строки его состава вычитаются ровно один
+    раз, в каком бы порядке ни удалялись корзины и состав.
+    """
+    shopping_list.remove_recipe(instance.user_id, instance.recipe_id)
+
+
+def _recipe_ingredient_row(instance):
+    return instance.recipe_id, instance.ingredient_id, instance.amount
+
+
+@receiver(pre_save, sender=RecipeIngredient)
+def remember_recipe_ingredient(instance, **kwargs):
+    """Запоминает сохраненную строку состава, чтобы перенести в списки
+    покупок только разницу"""
+    instance._saved_row = None
+    if not instance._state.adding:
+        instance._saved_row = RecipeIngredient.objects.filter(
+            pk=instance.pk
+        ).values_list('recipe_id', 'ingredient_id', 'amount').first()
+
+
+@receiver(post_save, sender=RecipeIngredient)
+def change_recipe_ingredient(instance, **kwargs):
+    """Переносит изменение состава из админки или ORM в списки покупок"""
+    shopping_list.change_row(
+        getattr(instance, '_saved_row', None),
+        _recipe_ingredient_row(instance),
+    )
+
+
+@receiver(post_delete, sender=RecipeIngredient)
+def remove_recipe_ingredient(instance, **kwargs):
+    """Вычитает удаленную строку состава из списков покупок"""
+    shopping_list.change_row(_recipe_ingredient_row(instance), None)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+@receiver((post_save, post_delete), sender=Tag)
+@receiver((post_save, post_delete), sender=Ingredient)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def bump_recipe_data_version(**kwargs):
+    """Сбрасывает кэшированные ответы с рецептами"""
+    bump_version_on_commit(RECIPE_DATA_VERSION_KEY)
+
+
+# Поля пользователя, которые выводятся в ответах с рецептами как автор
+AUTHOR_FIELDS = ('email', 'username', 'first_name', 'last_name')
+
+
+@receiver(pre_save, sender=User)
+def detect_author_data_change(instance, update_fields, **kwargs):
+    """Запоминает, изменились ли данные автора. Регистрация, вход и смена
+    пароля на ответы с рецептами не влияют"""
+    instance._author_data_changed = False
+    if instance._state.adding:
+        return
+    if update_fields is not None and not set(update_fields) & set(
+        AUTHOR_FIELDS
+    ):
+        return
+    saved = User.objects.filter(pk=instance.pk).values_list(
+        *AUTHOR_FIELDS
+    ).first()
+    instance._author_data_changed = saved is not None and saved != tuple(
+        getattr(instance, field) for field in AUTHOR_FIELDS
+    )
+
+
+@receiver(post_save, sender=User)
+def bump_recipe_data_version_on_user_change(instance, created, **kwargs):
+    """Данные автора входят в ответы с рецептами"""
+    if not created and getattr(instance, '_author_data_changed', False):
+        Recipe.objects.filter(author=instance).touch()
+        bump_version_on_commit(RECIPE_DATA_VERSION_KEY)
+
+
+@receiver((post_save, pre_delete), sender=Tag)
+def touch_tag_recipes(instance, **kwargs):
+    """Обновляет дату изменения рецептов с измененным тегом"""
+    Recipe.objects.filter(tags=instance).touch()
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_tag_registry(**kwargs):
+    """Сбрасывает справочник тегов"""
+    tag_registry.invalidate()
+
+
+@receiver((post_save, pre_delete), sender=Ingredient)
+def touch_ingredient_recipes(instance, **kwargs):
+    """Обновляет дату изменения рецептов с измененным ингредиентом"""
+    Recipe.objects.filter(ingredients=instance).touch()
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+@receiver((post_save, post_delete), sender=ShoppingCart)
+@receiver((post_save, post_delete), sender=Follow)
+def bump_user_state_version(instance, **kwargs):
+    """Флаги избранного, корзины и подписки входят в ответы пользователю"""
+    bump_version_on_commit(user_state_version_key(instance.user_id))
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Follow)
+def increment_counter(instance, created, **kwargs):
+    """Увеличивает счетчик избранного, корзин, рецептов или подписчиков"""
+    if created:
+        counters.record_counted(instance, 1)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Follow)
+def decrement_counter(instance, **kwargs):
+    """Уменьшает счетчик при удалении записи"""
+    counters.record_counted(instance, -1)
+
+
+@receiver(post_save, sender=Recipe)
+def fan_out_recipe(instance, created, **kwargs):
+    """Добавляет новый рецепт в ленты подписчиков"""
+    if created:
+        feed.fan_out(instance)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_feed(instance, created, **kwargs):
+    """Добавляет в ленту рецепты автора при подписке"""
+    if created:
+        feed.backfill(instance.user_id, instance.following_id)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_feed(instance, **kwargs):
+    """Убирает из ленты рецепты автора при отписке"""
+    feed.prune(instance.user_id, instance.following_id)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def update_pantry_recipe(instance, **kwargs):
+    """Перечитывает рецепт в индексе поиска по продуктам"""
+    pantry_index.recipes_changed([instance.pk])
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def update_pantry_recipe_ingredients(instance, **kwargs):
+    pantry_index.recipes_changed([instance.recipe_id])
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def update_pantry_recipe_tags(instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        pantry_index.recipes_changed([instance.pk])
+    elif pk_set:
+        pantry_index.recipes_changed(pk_set)
+    else:
+        # Очистка рецептов у тега (tag.recipes.clear())
+        pantry_index.invalidate()
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_pantry_index(**kwargs):
+    """Слаг тега входит во все маски, поэтому индекс строится заново"""
+    pantry_index.invalidate()
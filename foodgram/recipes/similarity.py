@@ -0,0 +1,168 @@
+"""Похожие рецепты по совпадению ингредиентов.
+
+Рецепт рассматривается как множество ингредиентов (строка разреженной
+матрицы рецепт x ингредиент), а сходство - как коэффициент Жаккара
+|A ∩ B| / |A ∪ B|. Пересечения считаются через инвертированный индекс
+ингредиент -> рецепты, то есть перебираются только рецепты, у которых
+есть хотя бы один общий ингредиент. Для каждого рецепта хранятся
+SIMILAR_RECIPES_COUNT ближайших соседей в таблице SimilarRecipe.
+"""
+import heapq
+import logging
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Count, F, Min, OuterRef, Subquery, Window
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
+
+from .images import get_executor
+from .models import RecipeIngredient, SimilarRecipe
+from .versions import RECIPE_DATA_VERSION_KEY, bump_version
+
+logger = logging.getLogger(__name__)
+
+
+def jaccard(overlap, size, other_size):
+    return overlap / (size + other_size - overlap)
+
+
+def nearest(scores, limit):
+    """limit лучших пар (рецепт, сходство), при равенстве - новее"""
+    return heapq.nlargest(
+        limit, scores.items(), key=lambda item: (item[1], item[0])
+    )
+
+
+def load_matrix():
+    """Строки матрицы {рецепт: ингредиенты} и индекс {ингредиент: рецепты}"""
+    rows = defaultdict(set)
+    postings = defaultdict(list)
+    pairs = RecipeIngredient.objects.values_list('recipe_id', 'ingredient_id')
+    for recipe_id, ingredient_id in pairs.order_by().iterator():
+        rows[recipe_id].add(ingredient_id)
+        postings[ingredient_id].append(recipe_id)
+    return rows, postings
+
+
+def compute_all(limit=None):
+    """Перебирает (рецепт, [(сосед, сходство), ...]) для всех рецептов"""
+    limit = limit or settings.SIMILAR_RECIPES_COUNT
+    rows, postings = load_matrix()
+    for recipe_id, ingredients in rows.items():
+        overlaps = Counter()
+        for ingredient_id in ingredients:
+            overlaps.update(postings[ingredient_id])
+        del overlaps[recipe_id]
+        scores = {
+            other_id: jaccard(overlap, len(ingredients), len(rows[other_id]))
+            for other_id, overlap in overlaps.items()
+        }
+        yield recipe_id, nearest(scores, limit)
+
+
+def candidates(recipe_id):
+    """Строки RecipeIngredient других рецептов с общими ингредиентами"""
+    return RecipeIngredient.objects.filter(
+        ingredient_id__in=RecipeIngredient.objects.filter(
+            recipe_id=recipe_id
+        ).values('ingredient_id')
+    ).exclude(recipe_id=recipe_id).order_by()
+
+
+def candidate_scores(recipe_id):
+    """Сходство рецепта со всеми рецептами, где есть общие ингредиенты"""
+    size = RecipeIngredient.objects.filter(recipe_id=recipe_id).count()
+    other_size = RecipeIngredient.objects.filter(
+        recipe_id=OuterRef('recipe_id')
+    ).order_by().values('recipe_id').annotate(
+        count=Count('pk')
+    ).values('count')
+    rows = candidates(recipe_id).values('recipe_id').annotate(
+        overlap=Count('pk'), size=Subquery(other_size)
+    ).values_list('recipe_id', 'overlap', 'size')
+    return {
+        other_id: jaccard(overlap, size, other_size)
+        for other_id, overlap, other_size in rows.iterator()
+    }
+
+
+def trim(recipe_ids, limit):
+    """Оставляет у рецептов recipe_ids не больше limit соседей"""
+    ranked = SimilarRecipe.objects.filter(
+        recipe_id__in=recipe_ids
+    ).annotate(neighbour_rank=Window(
+        expression=RowNumber(),
+        partition_by=[F('recipe')],
+        order_by=[F('score').desc(), F('similar').desc()],
+    )).values('pk', 'neighbour_rank')
+    sql, params = ranked.query.sql_with_params()
+    SimilarRecipe.objects.filter(pk__in=RawSQL(
+        f'SELECT id FROM ({sql}) AS ranked WHERE neighbour_rank > %s',
+        (*params, limit),
+    )).delete()
+
+
+def refresh_recipe(recipe_id):
+    """Пересчитывает соседей рецепта после изменения его ингредиентов.
+
+    Сам рецепт получает точный список соседей, а в списки других
+    рецептов он добавляется, если проходит в их top-K. Вытесненные
+    оттуда соседи восстановит только полный пересчет командой
+    rebuild_similar_recipes.
+    """
+    limit = settings.SIMILAR_RECIPES_COUNT
+    scores = candidate_scores(recipe_id)
+    SimilarRecipe.objects.filter(recipe_id=recipe_id).delete()
+    SimilarRecipe.objects.filter(similar_id=recipe_id).delete()
+    SimilarRecipe.objects.bulk_create(
+        SimilarRecipe(recipe_id=recipe_id, similar_id=other_id, score=score)
+        for other_id, score in nearest(scores, limit)
+    )
+    current = {
+        row['recipe_id']: row for row in SimilarRecipe.objects.filter(
+            recipe_id__in=candidates(recipe_id).values('recipe_id')
+        ).order_by().values('recipe_id').annotate(
+            count=Count('pk'), worst=Min('score')
+        )
+    } if scores else {}
+    accepted = [
+        other_id for other_id, score in scores.items()
+        if other_id not in current
+        or current[other_id]['count'] < limit
+        or score > current[other_id]['worst']
+    ]
+    SimilarRecipe.objects.bulk_create(
+        SimilarRecipe(recipe_id=other_id, similar_id=recipe_id,
+                      score=scores[other_id])
+        for other_id in accepted
+    )
+    overflowing = [other_id for other_id in accepted
+                   if other_id in current
+                   and current[other_id]['count'] >= limit]
+    if overflowing:
+        trim(overflowing, limit)
+
+
+def _refresh_task(recipe_id):
+    """Задача пула: пересчет соседей в отдельной транзакции"""
+    try:
+        with transaction.atomic():
+            refresh_recipe(recipe_id)
+        bump_version(RECIPE_DATA_VERSION_KEY)
+    except Exception:
+        logger.exception(
+            'Не удалось пересчитать похожие рецепты для %s', recipe_id
+        )
+        raise
+    finally:
+        connections.close_all()
+
+
+def schedule_refresh_recipe(recipe_id):
+    """Ставит пересчет соседей в очередь после фиксации транзакции, чтобы
+    не выполнять его в запросе на запись"""
+    transaction.on_commit(
+        lambda: get_executor().submit(_refresh_task, recipe_id)
+    )
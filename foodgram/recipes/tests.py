@@ -0,0 +1,191 @@
+from django.core.management import call_command
+from django.test import TestCase
+
+from users.models import User
+from .models import (Ingredient, Recipe, RecipeIngredient, ShoppingCart,
+                     ShoppingListItem, Tag)
+
+
+class AdminChangelistQueriesTest(TestCase):
+    """Число запросов страницы списка в админке не зависит от числа
+    строк"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            email='admin@example.com',
+            username='admin',
+            first_name='Админ',
+            last_name='Сайта',
+            password='Password12345!',
+        )
+        cls.tags = [
+            Tag.objects.create(
+                name=f'Тег {number}', color=f'#00000{number}',
+                slug=f'tag{number}',
+            )
+            for number in range(3)
+        ]
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def add_rows(self, count):
+        """Добавляет count ингредиентов и count рецептов с ними"""
+        start = Ingredient.objects.count()
+        ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {number}', measurement_unit=f'ед{number}'
+            )
+            for number in range(start, start + count)
+        ]
+        for number, ingredient in enumerate(ingredients, start=start):
+            recipe = Recipe.objects.create(
+                name=f'Рецепт {number}',
+                author=self.admin,
+                image='recipe_pics/test.png',
+                text='Описание',
+                cooking_time=10,
+            )
+            recipe.tags.set(self.tags)
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(recipe=recipe, ingredient=item, amount=1)
+                for item in ingredients[:3]
+            )
+
+    def assert_changelist_queries(self, url, count):
+        for rows in (5, 40):
+            self.add_rows(rows)
+            with self.subTest(rows=rows), self.assertNumQueries(count):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+
+    def test_recipe_changelist(self):
+        self.assert_changelist_queries('/admin/recipes/recipe/', 6)
+
+    def test_recipe_changelist_by_author(self):
+        self.assert_changelist_queries(
+            f'/admin/recipes/recipe/?author={self.admin.pk}', 7
+        )
+
+    def test_ingredient_changelist(self):
+        self.assert_changelist_queries('/admin/recipes/ingredient/', 5)
+
+    def test_recipe_ingredient_changelist(self):
+        self.assert_changelist_queries(
+            '/admin/recipes/recipeingredient/', 4
+        )
+
+
+class ShoppingListConsistencyTest(TestCase):
+    """Список покупок следует за составом рецепта, измененным не через
+    API"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            email='admin@example.com',
+            username='admin',
+            first_name='Админ',
+            last_name='Сайта',
+            password='Password12345!',
+        )
+        cls.tag = Tag.objects.create(name='Тег', color='#000000', slug='tag')
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {number}', measurement_unit='г'
+            )
+            for number in range(3)
+        ]
+        cls.recipes = []
+        for number in range(2):
+            recipe = Recipe.objects.create(
+                name=f'Рецепт {number}',
+                author=cls.admin,
+                image='recipe_pics/test.png',
+                text='Описание',
+                cooking_time=10,
+            )
+            recipe.tags.set([cls.tag])
+            for ingredient in cls.ingredients[:2]:
+                RecipeIngredient.objects.create(
+                    recipe=recipe, ingredient=ingredient, amount=2
+                )
+            ShoppingCart.objects.create(user=cls.admin, recipe=recipe)
+            cls.recipes.append(recipe)
+
+    def assert_consistent(self):
+        call_command('rebuild_shopping_lists', '--check', stdout=None)
+
+    def totals(self):
+        return dict(ShoppingListItem.objects.filter(
+            user=self.admin
+        ).values_list('ingredient_id', 'total'))
+
+    def test_orm_changes(self):
+        row = RecipeIngredient.objects.filter(
+            recipe=self.recipes[0], ingredient=self.ingredients[0]
+        ).get()
+        row.amount = 7
+        row.save()
+        self.assert_consistent()
+        row.ingredient = self.ingredients[2]
+        row.save()
+        self.assert_consistent()
+        row.recipe = self.recipes[1]
+        row.save()
+        self.assert_consistent()
+        row.delete()
+        self.assert_consistent()
+        RecipeIngredient.objects.create(
+            recipe=self.recipes[0], ingredient=self.ingredients[2], amount=3
+        )
+        self.assert_consistent()
+
+    def test_recipe_delete(self):
+        self.recipes[0].delete()
+        self.assert_consistent()
+        self.assertEqual(
+            self.totals(),
+            {ingredient.pk: 2 for ingredient in self.ingredients[:2]},
+        )
+
+    def test_admin_inline(self):
+        recipe = self.recipes[0]
+        rows = list(RecipeIngredient.objects.filter(
+            recipe=recipe
+        ).order_by('ingredient'))
+        prefix = 'ingredient_in_recipe'
+        data = {
+            'name': recipe.name,
+            'text': recipe.text,
+            'tags': [self.tag.pk],
+            'cooking_time': recipe.cooking_time,
+            f'{prefix}-TOTAL_FORMS': 3,
+            f'{prefix}-INITIAL_FORMS': 2,
+            f'{prefix}-MIN_NUM_FORMS': 1,
+            f'{prefix}-MAX_NUM_FORMS': 1000,
+            f'{prefix}-0-id': rows[0].pk,
+            f'{prefix}-0-recipe': recipe.pk,
+            f'{prefix}-0-ingredient': rows[0].ingredient_id,
+            f'{prefix}-0-amount': 5,
+            f'{prefix}-1-id': rows[1].pk,
+            f'{prefix}-1-recipe': recipe.pk,
+            f'{prefix}-1-ingredient': rows[1].ingredient_id,
+            f'{prefix}-1-amount': rows[1].amount,
+            f'{prefix}-1-DELETE': 'on',
+            f'{prefix}-2-recipe': recipe.pk,
+            f'{prefix}-2-ingredient': self.ingredients[2].pk,
+            f'{prefix}-2-amount': 4,
+        }
+        self.client.force_login(self.admin)
+        response = self.client.post(
+            f'/admin/recipes/recipe/{recipe.pk}/change/', data
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assert_consistent()
+        self.assertEqual(self.totals(), {
+            self.ingredients[0].pk: 7,
+            self.ingredients[1].pk: 2,
+            self.ingredients[2].pk: 4,
+        })
@@ -0,0 +1,100 @@
+"""Выгрузка и загрузка данных проекта построчно в формате NDJSON.
+
+Каждая модель пишется в свой файл <app_label>.<model>.ndjson[.gz], по
+одному объекту на строку. Модели перечислены в порядке зависимостей,
+поэтому при загрузке внешние ключи всегда ссылаются на уже загруженные
+строки. Производные данные (поисковый индекс, копии фото) в выгрузку
+не попадают и пересчитываются при загрузке; Recipe.updated_at получает
+время загрузки, поэтому закэшированные клиентами ответы устаревают.
+Токены авторизации, ленты и похожие рецепты выгружаются, чтобы после
+восстановления пользователи оставались в системе, а ленты и похожие
+рецепты не пустели. Если их файлов нет (выгрузка старой версии),
+загрузка продолжается с предупреждением, что нужно сделать вручную.
+"""
+import gzip
+import json
+import os
+
+from django.apps import apps
+from django.core.serializers.json import DjangoJSONEncoder
+
+MODEL_LABELS = (
+    'users.user',
+    'recipes.tag',
+    'recipes.ingredient',
+    'recipes.recipe',
+    'recipes.recipeingredient',
+    'recipes.recipe_tags',
+    'recipes.favorite',
+    'recipes.shoppingcart',
+    'recipes.shoppinglistitem',
+    'users.follow',
+    'recipes.feedentry',
+    'recipes.similarrecipe',
+    'authtoken.token',
+)
+# Модели, без файлов которых загрузка возможна: что сделать после нее
+OPTIONAL_MODELS = {
+    'recipes.feedentry': 'запустите rebuild_feed',
+    'recipes.similarrecipe': 'запустите rebuild_similar_recipes',
+    'authtoken.token': 'пользователям нужно войти заново',
+}
+SKIPPED_FIELDS = ('search_vector',)
+EXTENSION = '.ndjson'
+GZIP_EXTENSION = '.gz'
+
+
+def get_models():
+    return [apps.get_model(label) for label in MODEL_LABELS]
+
+
+def get_fields(model):
+    return [field for field in model._meta.concrete_fields
+            if field.name not in SKIPPED_FIELDS]
+
+
+def file_name(model, compress=False):
+    name = f'{model._meta.label_lower}{EXTENSION}'
+    return name + GZIP_EXTENSION if compress else name
+
+
+def open_dump(path, mode):
+    if path.endswith(GZIP_EXTENSION):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def find_dump(directory, model):
+    """Путь к файлу модели в каталоге выгрузки или None"""
+    for compress in (False, True):
+        path = os.path.join(directory, file_name(model, compress))
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def dump_rows(model, file, chunk_size):
+    """Пишет строки модели в файл, читая их курсором на стороне сервера"""
+    attnames = [field.attname for field in get_fields(model)]
+    rows = model._base_manager.order_by('pk').values_list(*attnames)
+    count = 0
+    for row in rows.iterator(chunk_size=chunk_size):
+        file.write(json.dumps(
+            dict(zip(attnames, row)), cls=DjangoJSONEncoder,
+            ensure_ascii=False,
+        ))
+        file.write('\n')
+        count += 1
+    return count
+
+
+def read_objects(model, file):
+    """Построчно превращает файл обратно в несохраненные объекты"""
+    fields = {field.attname: field for field in get_fields(model)}
+    for line in file:
+        if not line.strip():
+            continue
+        yield model(**{
+            attname: fields[attname].to_python(value)
+            for attname, value in json.loads(line).items()
+        })
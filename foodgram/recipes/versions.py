@@ -0,0 +1,61 @@
+"""Метки версий данных в общем кэше.
+
+Процессы сравнивают сохраненную метку с текущей, чтобы узнать, что данные
+изменились, - так локальные копии и кэшированные ответы сбрасываются во
+всех процессах сразу, без явной рассылки. Метка - случайная строка, а не
+счетчик: если ключ вытеснен из кэша или кэш очищен, создается новая
+метка, которая не совпадет ни с одной из прежних, поэтому устаревшие
+копии не станут снова актуальными. Метки сравниваются только на
+равенство. Вместе с меткой хранится время последнего изменения для
+заголовка Last-Modified.
+"""
+from time import time
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.db import transaction
+
+AUTH_TOKENS_VERSION_KEY = 'recipes:version:auth_tokens'
+INGREDIENTS_VERSION_KEY = 'recipes:version:ingredients'
+PANTRY_VERSION_KEY = 'recipes:version:pantry'
+RECIPE_DATA_VERSION_KEY = 'recipes:version:recipe_data'
+TAGS_VERSION_KEY = 'recipes:version:tags'
+
+
+def user_state_version_key(user_id):
+    """Версия избранного, корзины и подписок пользователя"""
+    return f'recipes:version:user:{user_id}'
+
+
+def _get_or_add(key, default):
+    value = cache.get(key)
+    if value is None:
+        cache.add(key, default, timeout=None)
+        value = cache.get(key, default)
+    return value
+
+
+def _new_version():
+    return uuid4().hex
+
+
+def get_version(key):
+    return _get_or_add(key, _new_version())
+
+
+def get_modified(key):
+    """Время последнего изменения данных в секундах Unix"""
+    return _get_or_add(f'{key}:modified', int(time()))
+
+
+def bump_version(key):
+    version = _new_version()
+    cache.set(f'{key}:modified', int(time()), timeout=None)
+    cache.set(key, version, timeout=None)
+    return version
+
+
+def bump_version_on_commit(key):
+    """Меняет метку версии после фиксации транзакции, чтобы другие процессы
+    не перестроили данные по еще не зафиксированному состоянию"""
+    transaction.on_commit(lambda: bump_version(key))
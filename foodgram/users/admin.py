@@ -1,6 +1,9 @@
 from django.contrib import admin
 from django.contrib.auth.models import Group
+from django.urls import reverse
+from django.utils.html import format_html
 
+from recipes.pagination import EstimatedCountPaginator
 from .models import Follow, User
 
 
@@ -18,17 +21,26 @@ class UserAdmin(admin.ModelAdmin):
         'author_followers_count',
         'author_recipes_count'
     )
-    list_filter = ('username', 'email')
+    list_filter = ('is_staff', 'is_active')
     search_fields = ('username', 'email')
     empty_value_display = '-пусто-'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
-    @admin.display(description='Количество подписчиков')
+    @admin.display(description='Количество подписчиков',
+                   ordering='followers_count')
     def author_followers_count(self, user):
-        return user.following.count()
+        return user.followers_count
 
-    @admin.display(description='Количество рецептов')
+    @admin.display(description='Количество рецептов',
+                   ordering='recipes_count')
     def author_recipes_count(self, user):
-        return user.recipe_author.count()
+        return format_html(
+            '<a href="{}?author={}">{}</a>',
+            reverse('admin:recipes_recipe_changelist'),
+            user.pk,
+            user.recipes_count,
+        )
 
 
 @admin.register(Follow)
@@ -38,4 +50,9 @@ class FollowAdmin(admin.ModelAdmin):
         'user',
         'following',
     )
+    list_select_related = ('user', 'following')
+    search_fields = ('user__username', 'following__username')
+    autocomplete_fields = ('user', 'following')
     empty_value_display = '-пусто-'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
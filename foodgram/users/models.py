@@ -1,10 +1,31 @@
 from django.conf import settings
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager
 from django.db import models
+from django.db.models import BooleanField, Exists, OuterRef, Value
 
 from .validators import username_validator
 
 
+class UserQuerySet(models.QuerySet):
+    """Набор запросов пользователей с флагами для текущего пользователя"""
+
+    def with_is_subscribed(self, user):
+        """Аннотирует флаг подписки текущего пользователя на автора"""
+        if user.is_anonymous:
+            return self.annotate(
+                is_subscribed=Value(False, output_field=BooleanField())
+            )
+        return self.annotate(
+            is_subscribed=Exists(Follow.objects.filter(
+                user=user, following=OuterRef('pk')
+            ))
+        )
+
+
+class FoodgramUserManager(UserManager.from_queryset(UserQuerySet)):
+    """Менеджер пользователей с методами UserQuerySet"""
+
+
 class User(AbstractUser):
     """Кастомная модель пользователя"""
     USERNAME_FIELD = 'email'
@@ -28,6 +49,18 @@ class User(AbstractUser):
         'Фамилия',
         max_length=settings.NAME_MAX_LENGTH,
     )
+    recipes_count = models.PositiveIntegerField(
+        'Количество рецептов',
+        default=0,
+        editable=False,
+    )
+    followers_count = models.PositiveIntegerField(
+        'Количество подписчиков',
+        default=0,
+        editable=False,
+    )
+
+    objects = FoodgramUserManager()
 
     class Meta:
         ordering = ('username',)
@@ -0,0 +1,24 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .models import User
+from .tokens import token_cache
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(instance, **kwargs):
+    """Выход через token/logout и удаление пользователя"""
+    token_cache.invalidate([instance.key])
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(instance, created, update_fields, **kwargs):
+    """Смена пароля, отключение и другие изменения пользователя; вход
+    (обновление last_login) кэш не затрагивает"""
+    if created:
+        return
+    if update_fields is None or set(update_fields) - {'last_login'}:
+        token_cache.invalidate(
+            Token.objects.filter(user=instance).values_list('key', flat=True)
+        )
@@ -0,0 +1,52 @@
+from django.test import TestCase
+
+from .models import Follow, User
+
+
+class AdminChangelistQueriesTest(TestCase):
+    """Число запросов страницы списка пользователей не зависит от числа
+    строк"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            email='admin@example.com',
+            username='admin',
+            first_name='Админ',
+            last_name='Сайта',
+            password='Password12345!',
+        )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def add_users(self, count):
+        start = User.objects.count()
+        User.objects.bulk_create(
+            User(
+                email=f'user{number}@example.com',
+                username=f'user{number}',
+                first_name='Пользователь',
+                last_name=str(number),
+            )
+            for number in range(start, start + count)
+        )
+        Follow.objects.bulk_create(
+            Follow(user=user, following=self.admin)
+            for user in User.objects.exclude(pk=self.admin.pk).filter(
+                follower__isnull=True
+            )
+        )
+
+    def assert_changelist_queries(self, url, count):
+        for rows in (5, 40):
+            self.add_users(rows)
+            with self.subTest(rows=rows), self.assertNumQueries(count):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+
+    def test_user_changelist(self):
+        self.assert_changelist_queries('/admin/users/user/', 4)
+
+    def test_follow_changelist(self):
+        self.assert_changelist_queries('/admin/users/follow/', 4)
@@ -0,0 +1,104 @@
+"""Кэш соответствия токен -> пользователь для авторизации по токену.
+
+Записи хранятся в ограниченном LRU в памяти процесса и в общем кэше.
+Запись в памяти действительна, пока не истек ее срок и не изменилась
+метка поколения в общем кэше: при выходе, смене пароля или отключении
+пользователя его записи удаляются из общего кэша, а поколение получает
+новую метку, и процессы перечитывают токены из общего кэша или БД.
+Метка случайная (см. recipes.versions), поэтому если ключ поколения
+вытеснен из кэша, все записи в памяти тоже становятся недействительными,
+а не оживают со старым номером.
+"""
+from collections import OrderedDict
+from hashlib import sha256
+from threading import Lock
+from time import monotonic
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import router, transaction
+
+from recipes.versions import (AUTH_TOKENS_VERSION_KEY, bump_version,
+                              get_version)
+from .models import User
+
+# Поля пользователя, которые хранятся в кэше, в порядке полей модели
+# (этого требует Model.from_db). Остальные (пароль, счетчики) остаются
+# отложенными и не перезаписываются при save().
+CACHED_FIELDS = tuple(
+    field.attname for field in User._meta.concrete_fields
+    if field.attname in {
+        'id', 'email', 'username', 'first_name', 'last_name',
+        'is_active', 'is_staff', 'is_superuser',
+    }
+)
+
+
+def _cache_key(key):
+    return f'auth:token:{sha256(key.encode()).hexdigest()}'
+
+
+class TokenCache:
+
+    def __init__(self, max_size, timeout):
+        self.max_size = max_size
+        self.timeout = timeout
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def _remember(self, key, values, generation):
+        with self._lock:
+            self._entries[key] = (
+                values, generation, monotonic() + self.timeout
+            )
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _restore(self, values):
+        return User.from_db(
+            router.db_for_read(User), list(CACHED_FIELDS), list(values)
+        )
+
+    def get(self, key):
+        """Пользователь по токену или None, если токена нет в кэше"""
+        generation = get_version(AUTH_TOKENS_VERSION_KEY)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                values, entry_generation, expires = entry
+                if entry_generation == generation and expires > monotonic():
+                    self._entries.move_to_end(key)
+                    return self._restore(values)
+                del self._entries[key]
+        values = cache.get(_cache_key(key))
+        if values is None:
+            return None
+        self._remember(key, values, generation)
+        return self._restore(values)
+
+    def set(self, key, user):
+        values = tuple(getattr(user, field) for field in CACHED_FIELDS)
+        generation = get_version(AUTH_TOKENS_VERSION_KEY)
+        cache.set(_cache_key(key), values, self.timeout)
+        self._remember(key, values, generation)
+
+    def invalidate(self, keys):
+        """Удаляет токены из кэша после фиксации транзакции"""
+        keys = list(keys)
+        if not keys:
+            return
+
+        def invalidate():
+            cache.delete_many([_cache_key(key) for key in keys])
+            with self._lock:
+                for key in keys:
+                    self._entries.pop(key, None)
+            bump_version(AUTH_TOKENS_VERSION_KEY)
+
+        transaction.on_commit(invalidate)
+
+
+token_cache = TokenCache(
+    settings.AUTH_TOKEN_CACHE_SIZE, settings.AUTH_TOKEN_CACHE_TIMEOUT
+)